@@ -4,10 +4,12 @@ from .oit import router as oit_router
 from .resources import router as resources_router
 from .ai import router as ai_router
 from .notifications import router as notifications_router
+from .health import router as health_router
 
 api_router = APIRouter()
 api_router.include_router(auth_router, prefix="/auth", tags=["auth"])
 api_router.include_router(oit_router, tags=["oit"])
 api_router.include_router(resources_router, tags=["resources"]) 
 api_router.include_router(ai_router, tags=["ai"])
-api_router.include_router(notifications_router)
\ No newline at end of file
+api_router.include_router(notifications_router)
+api_router.include_router(health_router)
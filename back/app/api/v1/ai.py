@@ -1,12 +1,29 @@
-from fastapi import APIRouter, Depends, Body
+try:
+    import multipart  # type: ignore
+    MULTIPART_AVAILABLE = True
+except Exception:
+    MULTIPART_AVAILABLE = False
+
+from fastapi import APIRouter, Depends, Body, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, Optional, List, Dict
+import json
+import logging
+import shutil
 
+from ...core.config import settings
 from ...core.dependencies import get_current_user
 from ...models.system_user import SystemUser
-from ...services.ai import OitAiService
+from ...services import llm_cache
+from ...services.ai_async import AsyncOitAiService
+from ...services.ai_batch import BatchDocument, BatchRejected, archive_documents, batch_work_dir, run_batch
+from ...services.ai_scheduler import AiPriority, OllamaBusy
+from ...services.uploads import UploadRejected, receive_upload
 
 router = APIRouter(tags=["ai"], prefix="/ai")
+logger = logging.getLogger("oit.ai")
 
 class ChatRequest(BaseModel):
     message: str
@@ -22,24 +39,85 @@ class ModelsResponse(BaseModel):
     models: List[str]
     default_model: str
 
+class BatchDocumentIn(BaseModel):
+    id: Optional[str] = None  # por defecto, la posición en la lista
+    document_text: str
+    reference_text: Optional[str] = None
+
+class BatchCheckRequest(BaseModel):
+    documents: List[BatchDocumentIn]
+    reference_text: Optional[str] = None
+    model: Optional[str] = None
+    skip_ids: List[str] = []  # ids ya recibidos en un intento anterior
+
 @router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, current_user: SystemUser = Depends(get_current_user)):
+async def chat(req: ChatRequest, current_user: SystemUser = Depends(get_current_user)):
     """Chat con el modelo local (Ollama). Si no está disponible, usa fallback.
     Permite especificar el modelo a utilizar.
     """
-    ai = OitAiService()
-    result = ai.chat(
+    ai = AsyncOitAiService()
+    try:
+        result = await ai.chat(
+            message=req.message,
+            system_prompt=req.system_prompt,
+            model=req.model
+        )
+    except OllamaBusy as exc:
+        raise _busy(exc)
+    return ChatResponse(reply=result["reply"], used_fallback=result.get("used_fallback", False), model=(req.model or ai.model))
+
+def _busy(exc: OllamaBusy) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="El modelo está saturado; intenta nuevamente en unos segundos",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def _sse(event: Dict) -> str:
+    kind = event.pop("type")
+    return f"event: {kind}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request, current_user: SystemUser = Depends(get_current_user)):
+    """Chat en streaming (Server-Sent Events).
+
+    Emite eventos ``token`` con cada fragmento generado y un evento final
+    ``done`` con tiempos y conteo de tokens. Si el cliente se desconecta se
+    corta la conexión con Ollama, que detiene la generación.
+    """
+    stream = AsyncOitAiService().stream_chat(
         message=req.message,
         system_prompt=req.system_prompt,
         model=req.model
     )
-    return ChatResponse(reply=result["reply"], used_fallback=result.get("used_fallback", False), model=(req.model or ai.model))
+    # Esperar turno y el primer evento antes de responder, para poder devolver 429
+    try:
+        first = await stream.__anext__()
+    except OllamaBusy as exc:
+        raise _busy(exc)
+
+    async def events():
+        try:
+            yield _sse(first)
+            async for event in stream:
+                if await request.is_disconnected():
+                    logger.info("Cliente desconectado; se cancela el chat en streaming")
+                    break
+                yield _sse(event)
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/models", response_model=ModelsResponse)
-def get_models(current_user: SystemUser = Depends(get_current_user)):
+async def get_models(current_user: SystemUser = Depends(get_current_user)):
     """Obtiene la lista de modelos disponibles en el servidor Ollama"""
-    ai = OitAiService()
-    models = ai.get_available_models()
+    ai = AsyncOitAiService()
+    models = await ai.get_available_models()
     # Convertir a lista de nombres simple como espera el frontend
     names: List[str] = []
     for m in models:
@@ -54,18 +132,112 @@ def get_models(current_user: SystemUser = Depends(get_current_user)):
     return ModelsResponse(models=names, default_model=ai.model)
 
 @router.post("/check-document", response_model=Dict)
-def check_document(
+async def check_document(
     document_text: str = Body(..., embed=True),
     reference_text: Optional[str] = Body(None, embed=True),
     model: Optional[str] = Body(None, embed=True),
     current_user: SystemUser = Depends(get_current_user)
 ):
     """Verifica un documento usando el modelo especificado"""
-    ai = OitAiService()
-    ref = reference_text or load_reference_text()
-    result = ai.check_document(document_text, ref, model)
+    ai = AsyncOitAiService(priority=AiPriority.REVIEW)
+    result = await ai.check_document(document_text, reference_text, model)
     return result
 
+def _ndjson_response(
+    request: Request,
+    items: List[BatchDocument],
+    reference_text: Optional[str],
+    model: Optional[str],
+    work_dir=None,
+) -> StreamingResponse:
+    """Resultados del lote en NDJSON: una línea por documento y un resumen final."""
+    if len(items) > settings.ai_batch_max_documents:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote tiene {len(items)} documentos; el máximo es {settings.ai_batch_max_documents}",
+        )
+
+    async def lines() -> AsyncIterator[str]:
+        results = run_batch(items, reference_text, model)
+        try:
+            async for line in results:
+                yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+                if await request.is_disconnected():
+                    logger.info("Cliente desconectado; se cancela el lote de revisión IA")
+                    break
+        finally:
+            await results.aclose()
+            if work_dir is not None:
+                await run_in_threadpool(shutil.rmtree, work_dir, True)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/check-document/batch")
+async def check_document_batch(
+    req: BatchCheckRequest, request: Request, current_user: SystemUser = Depends(get_current_user)
+):
+    """Verifica muchos documentos; responde NDJSON a medida que cada uno termina.
+
+    Cada línea es ``{"id", "ok", "result" | "error", "elapsed_ms"}`` y la última
+    ``{"summary": ...}``. Para reanudar un lote cortado basta reenviarlo con los
+    ``id`` ya recibidos en ``skip_ids``.
+    """
+    skip = set(req.skip_ids)
+    items = [
+        BatchDocument(id=doc.id or str(index), text=doc.document_text, reference_text=doc.reference_text)
+        for index, doc in enumerate(req.documents)
+        if (doc.id or str(index)) not in skip
+    ]
+    return _ndjson_response(request, items, req.reference_text, req.model)
+
+if MULTIPART_AVAILABLE:
+    from fastapi import File, Form, UploadFile
+
+    @router.post("/check-document/batch/archive")
+    async def check_document_batch_archive(
+        request: Request,
+        file: UploadFile = File(...),
+        reference_text: Optional[str] = Form(None),
+        model: Optional[str] = Form(None),
+        skip_ids: List[str] = Form([]),
+        current_user: SystemUser = Depends(get_current_user),
+    ):
+        """Como ``/check-document/batch`` para un ``.zip``/``.tar(.gz)`` de documentos ``.txt``/``.md``/``.pdf``.
+
+        El ``id`` de cada línea es la ruta del documento dentro del archivo.
+        """
+        work_dir = await run_in_threadpool(batch_work_dir)
+        try:
+            upload = await receive_upload(file, work_dir, max_pages=0)
+            items = await run_in_threadpool(archive_documents, upload.temp_path, work_dir)
+        except BaseException as exc:
+            await run_in_threadpool(shutil.rmtree, work_dir, True)
+            if isinstance(exc, UploadRejected):
+                raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+            if isinstance(exc, BatchRejected):
+                raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+            raise
+        skip = set(skip_ids)
+        items = [item for item in items if item.id not in skip]
+        return _ndjson_response(request, items, reference_text, model, work_dir)
+
+@router.delete("/cache", response_model=Dict)
+def purge_cache(current_user: SystemUser = Depends(get_current_user)):
+    """Vacía la caché de respuestas del modelo (memoria y disco)."""
+    removed = llm_cache.purge()
+    return {"removed": removed, "stats": llm_cache.cache_stats()}
+
+@router.get("/cache", response_model=Dict)
+def cache_stats(current_user: SystemUser = Depends(get_current_user)):
+    """Aciertos, fallos y tamaño de la caché de respuestas del modelo."""
+    return llm_cache.cache_stats()
+
 # Función auxiliar para cargar texto de referencia
 def load_reference_text() -> str:
     """Carga el texto de referencia para análisis de OIT"""
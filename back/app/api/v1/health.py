@@ -0,0 +1,28 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from ...core.loop_monitor import loop_monitor
+from ...services import llm_cache
+from ...services.ai import breaker_stats
+from ...services.ai_scheduler import scheduler
+from ...services.text_cache import cache_stats
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("", response_model=Dict[str, Any])
+def health() -> Dict[str, Any]:
+    """Estado del proceso y métricas de latencia del event loop.
+
+    Síncrono a propósito: las estadísticas de las cachés toman locks y la
+    primera lectura recorre el disco; en el threadpool no bloquean el loop.
+    """
+    return {
+        "status": "ok",
+        "event_loop": loop_monitor.snapshot(),
+        "text_cache": cache_stats(),
+        "llm_cache": llm_cache.cache_stats(),
+        "ollama_scheduler": scheduler.stats(),
+        "ollama_breaker": breaker_stats(),
+    }
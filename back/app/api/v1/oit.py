@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Request
 # Import condicional de soporte multipart
 try:
     import multipart  # type: ignore
@@ -10,21 +10,44 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from pathlib import Path
 from datetime import datetime
-import uuid
 import json
 import logging
 
 from ...database import get_db
+from ...core.config import settings
 from ...core.dependencies import get_current_user
 from ...models.system_user import SystemUser
 from ...models.oit_document import OitDocument
 from ...models.resource import Resource
 from ...models.resource_booking import ResourceBooking
-from ...schemas.oit import OitDocumentOut
-from ...services.ai import OitAiService, extract_text, load_reference_text
+from ...models.oit_job import OitJob
+from ...schemas.oit import OitDocumentOut, OitJobOut
+from ...services.ai import OitAiService
+from ...services.ai_scheduler import AiPriority
+from ...services.text_cache import document_text, iter_pages
 from ...services.notifications import create_notification
-from ...services.compliance import evaluate_compliance
+from ...services.uploads import ReceivedUpload, UploadRejected, discard_upload, finalize_upload, receive_bytes, receive_upload
+from ...services.storage import release_file, store_upload
+from ...services.reevaluation import current_progress, stale_count, start_reevaluation
+from ...services.sampling_schema import (
+    default_schema,
+    etag_matches,
+    generate_sampling_schema,
+    is_current,
+    schema_etag,
+    submit_sampling_schema,
+)
+from ...services.ingestion import (
+    UPLOADS_DIR,
+    REVIEWS_DIR,
+    apply_preliminary_verdict,
+    artifact_stem,
+    bundle_path_for,
+    create_ingest_job,
+    submit_job,
+)
 from fastapi.responses import StreamingResponse, FileResponse, Response
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Any, Dict, List
 from ...services.notifications import create_notification
@@ -35,56 +58,43 @@ router = APIRouter(tags=["oit"])
 if MULTIPART_AVAILABLE:
     from fastapi import UploadFile, File
 
+def _schema_response(request: Request, schema_json: str, current: bool) -> Response:
+    etag = schema_etag(schema_json)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Schema-Status": "current" if current else "pending"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=schema_json, media_type="application/json", headers=headers)
+
 @router.get("/oit/{doc_id}/sampling/schema", response_model=Dict)
-def get_sampling_schema(doc_id: int, db: Session = Depends(get_db), current_user: SystemUser = Depends(get_current_user)):
-    doc = db.query(OitDocument).filter(OitDocument.id == doc_id).first()
+def get_sampling_schema(doc_id: int, request: Request, db: Session = Depends(get_db), current_user: SystemUser = Depends(get_current_user)):
+    """Esquema del formulario de muestreo guardado en el documento (con ``ETag``).
+
+    Si falta o quedó obsoleto se encola su generación y mientras tanto se sirve
+    el anterior o el estático (``X-Schema-Status: pending``).
+    """
+    doc = _find_doc(db, doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
-    # Intentar generar esquema con IA; fallback estático
-    schema: Dict[str, Any] = {
-        "title": f"Formulario de muestreo OIT #{doc.id}",
-        "sections": [
-            {
-                "key": "general",
-                "label": "Datos generales",
-                "fields": [
-                    {"key": "fecha_inicio", "label": "Fecha de inicio", "type": "date"},
-                    {"key": "ubicacion", "label": "Ubicación", "type": "text"},
-                    {"key": "responsable", "label": "Responsable", "type": "text"},
-                ]
-            },
-            {
-                "key": "mediciones",
-                "label": "Mediciones",
-                "fields": [
-                    {"key": "ph_agua", "label": "pH del agua", "type": "number"},
-                    {"key": "turbidez", "label": "Turbidez (NTU)", "type": "number"},
-                    {"key": "observaciones", "label": "Observaciones", "type": "textarea"},
-                ]
-            }
-        ]
-    }
-    try:
-        ai = OitAiService()
-        file_path = BACK_DIR / doc.filename
-        text = extract_text(file_path)
-        prompt = "Genera un esquema JSON para formulario de muestreo con secciones y campos (key,label,type)."
-        result = ai.chat(message=prompt, system_prompt=text)
-        maybe = result.get("reply")
-        data = json.loads(maybe)
-        if isinstance(data, dict) and data.get("sections"):
-            schema = data
-    except Exception:
-        pass
-    return schema
+    current = is_current(doc)
+    if not current:
+        submit_sampling_schema(doc.id)
+    schema_json = doc.sampling_schema or json.dumps(default_schema(doc), ensure_ascii=False)
+    return _schema_response(request, schema_json, current)
+
+@router.post("/oit/{doc_id}/sampling/schema/regenerate", response_model=Dict)
+def regenerate_sampling_schema(doc_id: int, request: Request, db: Session = Depends(get_db), current_user: SystemUser = Depends(get_current_user)):
+    """Vuelve a generar el esquema con IA ahora mismo; conserva el anterior si falla."""
+    doc = _find_doc(db, doc_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    schema_json = generate_sampling_schema(db, doc, priority=AiPriority.INTERACTIVE, refresh=True)
+    if schema_json is None:
+        raise HTTPException(status_code=503, detail="No se pudo generar el esquema con IA; intenta más tarde")
+    return _schema_response(request, schema_json, True)
 logger = logging.getLogger("oit.api")
 
 # Directorio base del backend (../..../back)
 BACK_DIR = Path(__file__).resolve().parents[3]
-UPLOADS_DIR = BACK_DIR / "uploads" / "oit"
-UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
-REVIEWS_DIR = UPLOADS_DIR / "reviews"
-REVIEWS_DIR.mkdir(parents=True, exist_ok=True)
 ANALYSIS_DIR = UPLOADS_DIR / "analysis"
 ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -111,33 +121,24 @@ def _extract_gap_items(resource_gaps: Any) -> list[Dict[str, Any]]:
     return []
 
 
-def _bundle_path_for(doc: OitDocument) -> Path:
-    name = Path(doc.filename).stem
-    return REVIEWS_DIR / f"{name}_bundle.md"
-
-
-def _report_path_for(doc: OitDocument) -> Path:
-    name = Path(doc.filename).stem
-    return REVIEWS_DIR / f"{name}_report.json"
-
 def _sampling_meta_path(doc: OitDocument) -> Path:
-    name = Path(doc.filename).stem
+    name = artifact_stem(doc)
     return REVIEWS_DIR / f"{name}_sampling_meta.json"
 
 def _sampling_export_path(doc: OitDocument) -> Path:
-    name = Path(doc.filename).stem
+    name = artifact_stem(doc)
     return REVIEWS_DIR / f"{name}_sampling_export.txt"
 
 def _analysis_path_for(doc: OitDocument) -> Path:
-    name = Path(doc.filename).stem
+    name = artifact_stem(doc)
     return ANALYSIS_DIR / f"{name}_analysis.txt"
 
 def _analysis_file_path_for(doc: OitDocument) -> Path:
-    name = Path(doc.filename).stem
+    name = artifact_stem(doc)
     return ANALYSIS_DIR / f"{name}_analysis.pdf"
 
 
-def _serialize_doc(doc: OitDocument) -> OitDocumentOut:
+def _serialize_doc(doc: OitDocument, job_id: str | None = None) -> OitDocumentOut:
     alerts = _parse_list(doc.alerts)
     missing = _parse_list(doc.missing)
     evidence = _parse_list(doc.evidence)
@@ -154,7 +155,7 @@ def _serialize_doc(doc: OitDocument) -> OitDocumentOut:
 
     reference_bundle_path = doc.compliance_bundle_path
     if not reference_bundle_path:
-        bundle = _bundle_path_for(doc)
+        bundle = bundle_path_for(doc)
         if bundle.exists():
             reference_bundle_path = str(bundle.relative_to(BACK_DIR))
 
@@ -178,6 +179,9 @@ def _serialize_doc(doc: OitDocument) -> OitDocumentOut:
         "filename": doc.filename,
         "original_name": doc.original_name,
         "status": doc.status,
+        "processing_status": doc.processing_status or "done",
+        "partial": bool(doc.partial),
+        "job_id": job_id,
         "summary": doc.summary,
         "alerts": alerts,
         "missing": missing,
@@ -195,6 +199,7 @@ def _serialize_doc(doc: OitDocument) -> OitDocumentOut:
         "resource_gaps": resource_gaps,
         "approval_notes": doc.approval_notes,
         "review_notes": doc.review_notes,
+        "ai_path": doc.ai_path,
         "created_at": doc.created_at,
     }
     return OitDocumentOut.model_validate(data)
@@ -346,6 +351,61 @@ def download_sampling_export(doc_id: int, db: Session = Depends(get_db), current
     path = _sampling_export_path(doc)
     return FileResponse(path, media_type="text/plain", filename=path.name)
 
+def _mark_analysis_uploaded(doc: OitDocument) -> None:
+    meta_path = _sampling_meta_path(doc)
+    meta = {}
+    if meta_path.exists():
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except Exception:
+            meta = {}
+    meta["analysis_uploaded_at"] = datetime.utcnow().isoformat()
+    try:
+        meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    except Exception:
+        pass
+
+
+def _store_analysis_file(doc: OitDocument, upload: ReceivedUpload) -> Dict[str, Any]:
+    """Mueve el PDF de análisis a su ruta, extrae su texto y actualiza metadatos (bloqueante)."""
+    dest = _analysis_file_path_for(doc)
+    try:
+        finalize_upload(upload, dest)
+    except Exception as exc:
+        discard_upload(upload)
+        logger.warning(f"No se pudo guardar PDF de análisis: {exc}")
+        raise HTTPException(status_code=500, detail="No se pudo guardar el archivo de análisis")
+
+    # Intentar extraer texto del PDF para incluir en el informe final
+    txt_path = _analysis_path_for(doc)
+    try:
+        # Página a página: el texto completo nunca se materializa en memoria
+        with txt_path.open("w", encoding="utf-8") as fh:
+            for index, page in enumerate(iter_pages(dest, upload.sha256)):
+                if index:
+                    fh.write("\n")
+                fh.write(page)
+    except Exception:
+        # Si falla extracción, continuar con PDF solo
+        pass
+
+    _mark_analysis_uploaded(doc)
+    return _read_sampling_status(doc).model_dump()
+
+
+def _find_doc(db: Session, doc_id: int) -> OitDocument | None:
+    return db.query(OitDocument).filter(OitDocument.id == doc_id).first()
+
+
+async def _receive_or_reject(file, directory: Path) -> ReceivedUpload:
+    try:
+        return await receive_upload(file, directory)
+    except UploadRejected as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+    except Exception as exc:
+        logger.warning(f"No se pudo recibir archivo {file.filename}: {exc}")
+        raise HTTPException(status_code=500, detail="No se pudo guardar el archivo")
+
 if MULTIPART_AVAILABLE:
     @router.post("/oit/{doc_id}/analysis/upload")
     async def upload_analysis_file(
@@ -354,7 +414,8 @@ if MULTIPART_AVAILABLE:
         db: Session = Depends(get_db),
         current_user: SystemUser = Depends(get_current_user),
     ):
-        doc = db.query(OitDocument).filter(OitDocument.id == doc_id).first()
+        # Todo acceso a BD, disco y pypdf corre en el threadpool para no bloquear el event loop
+        doc = await run_in_threadpool(_find_doc, db, doc_id)
         if not doc:
             raise HTTPException(status_code=404, detail="Documento no encontrado")
         if not file or not file.filename:
@@ -363,38 +424,8 @@ if MULTIPART_AVAILABLE:
         if "pdf" not in content_type and not file.filename.lower().endswith(".pdf"):
             raise HTTPException(status_code=400, detail="Sólo se aceptan archivos PDF para el análisis")
 
-        dest = _analysis_file_path_for(doc)
-        try:
-            content = await file.read()
-            dest.write_bytes(content)
-        except Exception as exc:
-            logger.warning(f"No se pudo guardar PDF de análisis: {exc}")
-            raise HTTPException(status_code=500, detail="No se pudo guardar el archivo de análisis")
-
-        # Intentar extraer texto del PDF para incluir en el informe final
-        txt_path = _analysis_path_for(doc)
-        try:
-            extracted = extract_text(dest)
-            txt_path.write_text(extracted or "", encoding="utf-8")
-        except Exception:
-            # Si falla extracción, continuar con PDF solo
-            pass
-
-        # Actualizar metadatos de muestreo
-        meta_path = _sampling_meta_path(doc)
-        meta = {}
-        if meta_path.exists():
-            try:
-                meta = json.loads(meta_path.read_text(encoding="utf-8"))
-            except Exception:
-                meta = {}
-        meta["analysis_uploaded_at"] = datetime.utcnow().isoformat()
-        try:
-            meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
-        except Exception:
-            pass
-
-        return _read_sampling_status(doc).model_dump()
+        upload = await _receive_or_reject(file, ANALYSIS_DIR)
+        return await run_in_threadpool(_store_analysis_file, doc, upload)
 else:
     @router.post("/oit/{doc_id}/analysis/upload")
     def upload_analysis(
@@ -416,20 +447,7 @@ else:
             logger.warning(f"No se pudo escribir análisis: {exc}")
             raise HTTPException(status_code=500, detail="No se pudo guardar el análisis")
 
-        # Actualizar metadatos de muestreo
-        meta_path = _sampling_meta_path(doc)
-        meta = {}
-        if meta_path.exists():
-            try:
-                meta = json.loads(meta_path.read_text(encoding="utf-8"))
-            except Exception:
-                meta = {}
-        meta["analysis_uploaded_at"] = datetime.utcnow().isoformat()
-        try:
-            meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
-        except Exception:
-            pass
-
+        _mark_analysis_uploaded(doc)
         return _read_sampling_status(doc).model_dump()
 
 
@@ -512,151 +530,58 @@ def _build_plan(doc: OitDocument, plan_request: PlanRequest, db: Session) -> tup
     return plan, gaps
 
 
-def _merge_lists(*lists: list[str] | None) -> list[str]:
-    seen: set[str] = set()
-    merged: list[str] = []
-    for lst in lists:
-        if not lst:
-            continue
-        for item in lst:
-            value = (item or "").strip()
-            if not value:
-                continue
-            key = value.lower()
-            if key in seen:
-                continue
-            seen.add(key)
-            merged.append(value)
-    return merged
+def _enqueue_document(db: Session, upload: ReceivedUpload, original_name: str | None, current_user: SystemUser) -> OitDocumentOut:
+    # Un solo archivo físico por contenido; los duplicados suman referencias
+    stored = store_upload(db, upload, UPLOADS_DIR)
+    doc = OitDocument(
+        filename=stored.path,  # uploads/oit/<sha256><ext>
+        original_name=original_name,
+        content_hash=stored.sha256,
+        status="pending",
+        processing_status="queued",
+        summary="Documento en cola de procesamiento.",
+        alerts=json.dumps([]),
+        missing=json.dumps([]),
+        evidence=json.dumps([]),
+        approval_status="pending",
+        created_by_id=current_user.id,
+    )
+    db.add(doc)
+    db.commit()
+    db.refresh(doc)
+    # Veredicto provisional con las primeras páginas; el job lo reemplaza al terminar
+    if apply_preliminary_verdict(doc):
+        db.add(doc)
+        db.commit()
+    job = create_ingest_job(db, doc)
+    submit_job(job.id)
+    logger.info(f"Documento OIT id={doc.id} encolado en job={job.id}")
+    return _serialize_doc(doc, job_id=job.id)
 
 if MULTIPART_AVAILABLE:
-    @router.post("/oit/upload", response_model=OitDocumentOut)
+    @router.post("/oit/upload", response_model=OitDocumentOut, status_code=202)
     async def upload_oit(
         file: UploadFile = File(...),
         db: Session = Depends(get_db),
         current_user: SystemUser = Depends(get_current_user),
     ):
-        # Guardar archivo con nombre único
-        ext = Path(file.filename).suffix
-        safe_name = f"{uuid.uuid4().hex}{ext}"
-        dest = UPLOADS_DIR / safe_name
-        content = await file.read()
-        dest.write_bytes(content)
-        logger.info(f"Subida OIT por usuario={getattr(current_user, 'id', 'anon')}: original={file.filename} -> {dest}")
-
-        # Extraer texto
-        doc_text = extract_text(dest)
-        logger.info(f"Extraído texto OIT: longitud={len(doc_text)}")
-        if not doc_text:
-            raise HTTPException(status_code=400, detail="No se pudo leer el documento o está vacío")
-    
-        # Evaluación por README corporativos
-        compliance = evaluate_compliance(doc_text)
-        compliance_result = compliance.get("result", {})
-        comp_status = compliance_result.get("status")
-        comp_summary = compliance_result.get("summary")
-        comp_alerts = compliance_result.get("alerts", [])
-        comp_missing = compliance_result.get("missing", [])
-        comp_evidence = compliance_result.get("evidence", [])
+        """Guarda el archivo y encola extracción, compliance y revisión IA.
+
+        Responde 202 con el documento en estado ``queued`` y el ``job_id`` a
+        consultar en ``GET /oit/jobs/{job_id}``. Si ``PRELIMINARY_MAX_PAGES`` > 0
+        incluye un veredicto provisional (``partial=true``) de las primeras páginas.
+        """
+        # Recibir en streaming (hash y límites); el almacenamiento se direcciona por sha256
+        upload = await _receive_or_reject(file, UPLOADS_DIR)
         logger.info(
-            "Resultado compliance README: status=%s, alerts=%d, missing=%d",
-            comp_status,
-            len(comp_alerts),
-            len(comp_missing),
-        )
-
-        # Analizar con IA (Ollama / fallback) como complemento informativo
-        ref_text = load_reference_text()
-        logger.info(f"Referencias IA cargadas: longitud={len(ref_text)}")
-        ai = OitAiService()
-        logger.info("Iniciando análisis IA complementario")
-        ai_result = ai.analyze(doc_text, ref_text)
-
-        status = comp_status or ai_result.get("status", "error")
-        summary = comp_summary or ai_result.get("summary")
-        alerts = _merge_lists(comp_alerts, ai_result.get("alerts"))
-        missing = _merge_lists(comp_missing, ai_result.get("missing"))
-        evidence = _merge_lists(comp_evidence, ai_result.get("evidence"))
-        logger.info(
-            "Resultado final: status=%s, alerts=%d, missing=%d, evidence=%d",
-            status,
-            len(alerts),
-            len(missing),
-            len(evidence),
-        )
-
-        # Guardar en BD (ruta relativa a back/)
-        review_notes = ai_result.get("notes") or ai_result.get("summary") or ""
-
-        doc = OitDocument(
-            filename=str(dest.relative_to(BACK_DIR)),  # uploads/oit/<archivo>
-            original_name=file.filename,
-            status=status,
-            summary=summary,
-            alerts=json.dumps(alerts, ensure_ascii=False),
-            missing=json.dumps(missing, ensure_ascii=False),
-            evidence=json.dumps(evidence, ensure_ascii=False),
-            compliance_bundle_path=None,
-            compliance_report_path=None,
-            approval_status="pending",
-            resource_plan=None,
-            resource_gaps=None,
-            approval_notes=None,
-            review_notes=review_notes,
-            created_by_id=current_user.id,
-        )
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-        logger.info(f"Documento OIT persistido id={doc.id}")
-
-        # Guardar reportes compliance
-        bundle_path = _bundle_path_for(doc)
-        report_path = _report_path_for(doc)
-
-        bundle_relative = None
-        report_relative = None
-        try:
-            bundle_path.write_text(compliance.get("readme_combined", ""), encoding="utf-8")
-            bundle_relative = str(bundle_path.relative_to(BACK_DIR))
-        except Exception as exc:
-            logger.warning(f"No se pudo escribir bundle README: {exc}")
-        try:
-            report_path.write_text(json.dumps(compliance, ensure_ascii=False, indent=2), encoding="utf-8")
-            report_relative = str(report_path.relative_to(BACK_DIR))
-        except Exception as exc:
-            logger.warning(f"No se pudo escribir reporte compliance: {exc}")
-
-        doc.compliance_bundle_path = bundle_relative
-        doc.compliance_report_path = report_relative
-        doc.can_recommend = doc.status == "check" and len(alerts) == 0 and len(missing) == 0
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-
-        notification_type = "oit.approved" if doc.status == "check" else "oit.review_required"
-        notification_title = "OIT lista" if doc.status == "check" else "OIT requiere revisión"
-        notification_message = (
-            f"La OIT #{doc.id} fue aprobada sin alertas." if doc.status == "check" else doc.summary or "La IA detectó observaciones."
-        )
-        create_notification(
-            db,
-            user_id=current_user.id,
-            type=notification_type,
-            title=notification_title,
-            message=notification_message,
-            document_id=doc.id,
-            payload={
-                "status": doc.status,
-                "alerts": alerts,
-                "missing": missing,
-            },
+            f"Subida OIT por usuario={getattr(current_user, 'id', 'anon')}: original={file.filename} "
+            f"({upload.size} bytes, sha256={upload.sha256})"
         )
 
-        return _serialize_doc(doc)
+        return await run_in_threadpool(_enqueue_document, db, upload, file.filename, current_user)
 else:
     # Endpoint alternativo para pruebas sin python-multipart instalado
-    @router.post("/oit/upload-raw", response_model=OitDocumentOut)
+    @router.post("/oit/upload-raw", response_model=OitDocumentOut, status_code=202)
     def upload_oit_raw(
         text: str = Body(..., embed=True),
         db: Session = Depends(get_db),
@@ -665,87 +590,34 @@ else:
         if not text or not text.strip():
             raise HTTPException(status_code=400, detail="Texto vacío")
         # Guardar como archivo .txt para trazabilidad
-        safe_name = f"{uuid.uuid4().hex}.txt"
-        dest = UPLOADS_DIR / safe_name
-        dest.write_text(text, encoding="utf-8")
-        logger.info(f"Subida RAW OIT por usuario={getattr(current_user, 'id', 'anon')}: -> {dest}")
-
-        doc_text = text.strip()
-        compliance = evaluate_compliance(doc_text)
-        compliance_result = compliance.get("result", {})
-        comp_status = compliance_result.get("status")
-        comp_summary = compliance_result.get("summary")
-        comp_alerts = compliance_result.get("alerts", [])
-        comp_missing = compliance_result.get("missing", [])
-        comp_evidence = compliance_result.get("evidence", [])
-        logger.info(
-            "Resultado compliance README RAW: status=%s, alerts=%d, missing=%d",
-            comp_status,
-            len(comp_alerts),
-            len(comp_missing),
-        )
-
-        ref_text = load_reference_text()
-        ai = OitAiService()
-        logger.info("Iniciando análisis IA RAW complementario")
-        ai_result = ai.analyze(doc_text, ref_text)
-
-        status = comp_status or ai_result.get("status", "error")
-        summary = comp_summary or ai_result.get("summary")
-        alerts = _merge_lists(comp_alerts, ai_result.get("alerts"))
-        missing = _merge_lists(comp_missing, ai_result.get("missing"))
-        evidence = _merge_lists(comp_evidence, ai_result.get("evidence"))
-        logger.info(
-            "Resultado final RAW: status=%s, alerts=%d, missing=%d, evidence=%d",
-            status,
-            len(alerts),
-            len(missing),
-            len(evidence),
-        )
-
-        doc = OitDocument(
-            filename=str(dest.relative_to(BACK_DIR)),
-            original_name="raw.txt",
-            status=status,
-            summary=summary,
-            alerts=json.dumps(alerts, ensure_ascii=False),
-            missing=json.dumps(missing, ensure_ascii=False),
-            evidence=json.dumps(evidence, ensure_ascii=False),
-            compliance_bundle_path=None,
-            compliance_report_path=None,
-            approval_status="pending",
-            resource_plan=None,
-            resource_gaps=None,
-            approval_notes=None,
-        )
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-        logger.info(f"Documento OIT RAW persistido id={doc.id}")
-
-        bundle_path = _bundle_path_for(doc)
-        report_path = _report_path_for(doc)
-        bundle_relative = None
-        report_relative = None
-        try:
-            bundle_path.write_text(compliance.get("readme_combined", ""), encoding="utf-8")
-            bundle_relative = str(bundle_path.relative_to(BACK_DIR))
-        except Exception as exc:
-            logger.warning(f"No se pudo escribir bundle README RAW: {exc}")
-        try:
-            report_path.write_text(json.dumps(compliance, ensure_ascii=False, indent=2), encoding="utf-8")
-            report_relative = str(report_path.relative_to(BACK_DIR))
-        except Exception as exc:
-            logger.warning(f"No se pudo escribir reporte compliance RAW: {exc}")
-
-        doc.compliance_bundle_path = bundle_relative
-        doc.compliance_report_path = report_relative
-        doc.can_recommend = doc.status == "check" and len(alerts) == 0 and len(missing) == 0
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
+        upload = receive_bytes(text.encode("utf-8"), UPLOADS_DIR, ".txt")
+        logger.info(f"Subida RAW OIT por usuario={getattr(current_user, 'id', 'anon')}: sha256={upload.sha256}")
+
+        return _enqueue_document(db, upload, "raw.txt", current_user)
+
+@router.post("/oit/compliance/reevaluate", status_code=202)
+def start_compliance_reevaluation(current_user: SystemUser = Depends(get_current_user)):
+    """Reevalúa en segundo plano las OIT con reglas de compliance desactualizadas."""
+    progress = start_reevaluation()
+    if progress is None:
+        raise HTTPException(status_code=409, detail="Ya hay una reevaluación en curso")
+    logger.info(f"Reevaluación compliance iniciada por usuario={getattr(current_user, 'id', 'anon')}")
+    return progress.as_dict()
+
+@router.get("/oit/compliance/reevaluate")
+def get_compliance_reevaluation(db: Session = Depends(get_db), current_user: SystemUser = Depends(get_current_user)):
+    progress = current_progress()
+    return {
+        "stale": stale_count(db),
+        "progress": progress.as_dict() if progress else None,
+    }
 
-        return _serialize_doc(doc)
+@router.get("/oit/jobs/{job_id}", response_model=OitJobOut)
+def get_oit_job(job_id: str, db: Session = Depends(get_db), current_user: SystemUser = Depends(get_current_user)):
+    job = db.query(OitJob).filter(OitJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
 
 @router.get("/oit/{doc_id}", response_model=OitDocumentOut)
 def get_oit(doc_id: int, db: Session = Depends(get_db), current_user: SystemUser = Depends(get_current_user)):
@@ -754,6 +626,20 @@ def get_oit(doc_id: int, db: Session = Depends(get_db), current_user: SystemUser
         raise HTTPException(status_code=404, detail="Documento no encontrado")
     return _serialize_doc(doc)
 
+@router.delete("/oit/{doc_id}", status_code=204)
+def delete_oit(doc_id: int, db: Session = Depends(get_db), current_user: SystemUser = Depends(get_current_user)):
+    doc = db.query(OitDocument).filter(OitDocument.id == doc_id).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    if doc.processing_status in ("queued", "extracting", "reviewing"):
+        raise HTTPException(status_code=409, detail="El documento aún se está procesando")
+    content_hash = doc.content_hash
+    db.delete(doc)
+    db.commit()
+    # El archivo físico se elimina sólo cuando ningún otro documento lo referencia
+    release_file(db, content_hash)
+    return Response(status_code=204)
+
 @router.get("/oit", response_model=list[OitDocumentOut])
 def list_oit(db: Session = Depends(get_db), current_user: SystemUser = Depends(get_current_user)):
     docs = db.query(OitDocument).order_by(OitDocument.created_at.desc()).limit(50).all()
@@ -793,7 +679,7 @@ def download_reference_bundle(doc_id: int, db: Session = Depends(get_db), curren
     doc = db.query(OitDocument).filter(OitDocument.id == doc_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
-    bundle_path = _bundle_path_for(doc)
+    bundle_path = bundle_path_for(doc)
     if doc.compliance_bundle_path and (BACK_DIR / doc.compliance_bundle_path).exists():
         bundle_path = BACK_DIR / doc.compliance_bundle_path
     elif not bundle_path.exists():
@@ -806,10 +692,9 @@ def oit_recommendations(doc_id: int, db: Session = Depends(get_db), current_user
     if not doc:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
 
-    file_path = BACK_DIR / doc.filename
     text = ""
     try:
-        text = extract_text(file_path)
+        text = document_text(doc)
     except Exception:
         text = ""
 
@@ -852,10 +737,9 @@ def create_plan(
 
     plan_request = payload
 
-    file_path = BACK_DIR / doc.filename
     text = ""
     try:
-        text = extract_text(file_path)
+        text = document_text(doc)
     except Exception:
         text = ""
 
@@ -982,6 +866,10 @@ def confirm_plan(
     db.commit()
     db.refresh(doc)
 
+    if payload.approved and not is_current(doc):
+        # Dejar listo el formulario de muestreo antes de que se abra
+        submit_sampling_schema(doc.id)
+
     notification_type = "oit.plan_approved" if payload.approved else "oit.plan_revision"
     notification_title = "Programación aprobada" if payload.approved else "Programación requiere ajustes"
     notification_message = (
@@ -1002,6 +890,28 @@ def confirm_plan(
 
     return _serialize_doc(doc)
 
+def _iter_analysis_text(doc: OitDocument):
+    """Texto del análisis en bloques: desde el .txt guardado o, si falta, del PDF (caché)."""
+    txt_path = _analysis_path_for(doc)
+    emitted = False
+    try:
+        if txt_path.exists():
+            with txt_path.open("r", encoding="utf-8") as fh:
+                for block in iter(lambda: fh.read(64 * 1024), ""):
+                    emitted = True
+                    yield block
+    except Exception:
+        pass
+    if emitted:
+        return
+    pdf_path = _analysis_file_path_for(doc)
+    try:
+        if pdf_path.exists():
+            for index, page in enumerate(iter_pages(pdf_path)):
+                yield ("\n" + page) if index else page
+    except Exception:
+        return
+
 @router.post("/oit/{doc_id}/final-report")
 def generate_final_report(
     doc_id: int,
@@ -1017,42 +927,34 @@ def generate_final_report(
     status = _read_sampling_status(doc)
     if not status.final_report_allowed:
         raise HTTPException(status_code=403, detail="El informe final sólo se genera después de subir el análisis")
-    # Cargar contenido del análisis (texto); si no existe, intentar extraer del PDF
-    analysis_text = ""
-    try:
-        analysis_text = _analysis_path_for(doc).read_text(encoding="utf-8")
-    except Exception:
-        analysis_text = ""
-    if not analysis_text:
-        pdf_path = _analysis_file_path_for(doc)
-        try:
-            if pdf_path.exists():
-                analysis_text = extract_text(pdf_path) or ""
-        except Exception:
-            analysis_text = ""
-
-    # Construir texto básico de informe; en el futuro se puede invocar IA
-    lines = []
-    lines.append(f"INFORME FINAL OIT #{doc.id}")
-    lines.append("")
-    lines.append(f"Documento: {doc.original_name or doc.filename}")
-    lines.append(f"Estado: {doc.status}")
-    lines.append(f"Programación aprobada: {doc.approval_status}")
-    lines.append(f"Fecha de carga: {doc.created_at}")
-    lines.append("")
-    lines.append("Resumen:")
-    lines.append(doc.summary or "(sin resumen)")
-    lines.append("")
-    lines.append("Datos de Muestreo:")
+    header = []
+    header.append(f"INFORME FINAL OIT #{doc.id}")
+    header.append("")
+    header.append(f"Documento: {doc.original_name or doc.filename}")
+    header.append(f"Estado: {doc.status}")
+    header.append(f"Programación aprobada: {doc.approval_status}")
+    header.append(f"Fecha de carga: {doc.created_at}")
+    header.append("")
+    header.append("Resumen:")
+    header.append(doc.summary or "(sin resumen)")
+    header.append("")
+    header.append("Datos de Muestreo:")
     for k, v in (sampling or {}).items():
-        lines.append(f"- {k}: {v}")
-    lines.append("")
-    lines.append("Análisis:")
-    lines.append(analysis_text or "(sin análisis)")
-    content = "\n".join(lines)
+        header.append(f"- {k}: {v}")
+    header.append("")
+    header.append("Análisis:")
+    header.append("")
 
+    # Construir texto básico de informe; en el futuro se puede invocar IA.
+    # El análisis se emite en streaming para no cargarlo entero en memoria.
     def _iter():
-        yield content
+        yield "\n".join(header)
+        empty = True
+        for chunk in _iter_analysis_text(doc):
+            empty = False
+            yield chunk
+        if empty:
+            yield "(sin análisis)"
 
     filename = f"informe_final_{doc_id}.txt"
     headers = {"Content-Disposition": f"attachment; filename=\"{filename}\""}
@@ -1071,19 +973,6 @@ def generate_final_report_html(
     status = _read_sampling_status(doc)
     if not status.final_report_allowed:
         raise HTTPException(status_code=403, detail="El informe final sólo se genera después de subir el análisis")
-    analysis_text = ""
-    try:
-        analysis_text = _analysis_path_for(doc).read_text(encoding="utf-8")
-    except Exception:
-        analysis_text = ""
-    if not analysis_text:
-        pdf_path = _analysis_file_path_for(doc)
-        try:
-            if pdf_path.exists():
-                analysis_text = extract_text(pdf_path) or ""
-        except Exception:
-            analysis_text = ""
-
     tpl_path = BACK_DIR / "app" / "report_templates" / "final_report.html"
     try:
         html = tpl_path.read_text(encoding="utf-8")
@@ -1100,6 +989,18 @@ def generate_final_report_html(
         .replace("{{created_at}}", str(doc.created_at))
         .replace("{{summary}}", (doc.summary or "(sin resumen)").replace("<", "&lt;").replace(">", "&gt;"))
         .replace("{{sampling_items}}", sampling_items)
-        .replace("{{analysis_text}}", (analysis_text or "(sin análisis)").replace("<", "&lt;").replace(">", "&gt;"))
     )
-    return Response(content=out, media_type="text/html", headers={"Content-Disposition": f"attachment; filename=\"informe_final_{doc_id}.html\""})
\ No newline at end of file
+    before, marker, after = out.partition("{{analysis_text}}")
+
+    def _iter():
+        yield before
+        if marker:
+            empty = True
+            for chunk in _iter_analysis_text(doc):
+                empty = False
+                yield chunk.replace("<", "&lt;").replace(">", "&gt;")
+            if empty:
+                yield "(sin análisis)"
+        yield after
+
+    return StreamingResponse(_iter(), media_type="text/html", headers={"Content-Disposition": f"attachment; filename=\"informe_final_{doc_id}.html\""})
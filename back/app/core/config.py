@@ -32,6 +32,83 @@ class Settings(BaseSettings):
     # Resend email configuration
     resend_api_key: str = Field(default="")
     resend_from: str = Field(default="")
+
+    # Procesamiento en segundo plano de OIT (extracción, compliance e IA)
+    ingestion_workers: int = Field(default=2)
+
+    # Límites de subida de archivos (0 desactiva el límite)
+    upload_max_bytes: int = Field(default=150 * 1024 * 1024)
+    upload_max_pages: int = Field(default=1000)
+    upload_chunk_size: int = Field(default=1024 * 1024)
+
+    # Veredicto preliminar al subir: primeras N páginas / caracteres (0 páginas lo desactiva)
+    preliminary_max_pages: int = Field(default=3)
+    preliminary_max_chars: int = Field(default=20000)
+    # Plazo total (s) para extraer esas páginas de un PDF durante la subida; si vence no hay veredicto preliminar
+    preliminary_timeout_s: float = Field(default=10.0)
+
+    # Puntuación BM25 de requisitos compliance: umbral de cobertura (0-1) y tamaño de pasaje
+    compliance_pass_score: float = Field(default=0.45)
+    compliance_passage_tokens: int = Field(default=120)
+    compliance_bm25_k1: float = Field(default=1.2)
+    compliance_bm25_b: float = Field(default=0.75)
+
+    # Reevaluación masiva de OIT al cambiar las reglas (0 workers = un proceso por CPU)
+    reevaluation_workers: int = Field(default=0)
+    reevaluation_batch_size: int = Field(default=50)
+
+    # Caché de texto extraído: LRU en memoria (sólo documentos pequeños) delante de los .txt.gz
+    text_cache_entries: int = Field(default=16)
+    text_cache_max_chars: int = Field(default=2_000_000)
+
+    # Extracción de PDF en pool de procesos (0 = un worker por CPU)
+    pdf_extract_workers: int = Field(default=0)
+    pdf_parallel_min_pages: int = Field(default=16)
+    pdf_page_timeout_s: float = Field(default=20.0)
+
+    # Cliente HTTP compartido hacia Ollama (pool keep-alive y timeouts separados)
+    ollama_pool_size: int = Field(default=10)
+    ollama_connect_timeout_s: float = Field(default=3.0)
+    ollama_read_timeout_s: float = Field(default=90.0)
+    # Circuit breaker: tras N fallos seguidos (timeouts, conexión, 5xx) se usa el fallback durante el enfriamiento
+    ollama_breaker_failures: int = Field(default=5)
+    ollama_breaker_cooldown_s: float = Field(default=30.0)
+    ollama_breaker_probes: int = Field(default=1)
+    # Caché de /api/tags: vigente por TTL; vencida se sirve y refresca en segundo plano hasta MAX_STALE
+    ollama_models_ttl_s: float = Field(default=30.0)
+    ollama_models_max_stale_s: float = Field(default=600.0)
+
+    # Planificador de generaciones: concurrencia hacia Ollama y cola con prioridad (llena = 429/fallback)
+    ollama_max_concurrency: int = Field(default=2)
+    ollama_queue_max: int = Field(default=64)
+
+    # Caché de respuestas IA deterministas: LRU en memoria + disco acotado en bytes
+    llm_cache_memory_entries: int = Field(default=128)
+    llm_cache_max_bytes: int = Field(default=200 * 1024 * 1024)
+
+    # Máximo de caracteres del documento en prompts IA de una pasada (esquema de muestreo) y en la heurística de respaldo
+    ai_document_max_chars: int = Field(default=24000)
+    # Revisión IA en la ingesta: auto|sync|async|skip (auto decide por estado de compliance, tamaño y cola)
+    ai_review_policy: str = Field(default="auto")
+    ai_policy_skip_statuses: str = Field(default="check")
+    ai_policy_async_statuses: str = Field(default="alerta,error")
+    ai_policy_sync_max_chars: int = Field(default=12000)
+    ai_policy_max_queue: int = Field(default=16)
+    # Lotes de /ai/check-document/batch: documentos revisados a la vez, máximo por lote y bytes descomprimidos por archivo
+    ai_batch_concurrency: int = Field(default=4)
+    ai_batch_max_documents: int = Field(default=1000)
+    ai_batch_max_archive_bytes: int = Field(default=1024 * 1024 * 1024)
+    # Documentos más largos que AI_CHUNK_TOKENS se revisan por fragmentos en paralelo (map-reduce)
+    ai_chunk_tokens: int = Field(default=2500)
+    ai_chunk_workers: int = Field(default=4)
+    # Referencias en el prompt: fragmentos por sección, top-k por BM25 dentro de un presupuesto de tokens
+    reference_chunk_tokens: int = Field(default=200)
+    reference_top_k: int = Field(default=6)
+    reference_max_tokens: int = Field(default=1500)
+
+    # Monitor de bloqueo del event loop
+    loop_lag_interval_ms: int = Field(default=500)
+    loop_lag_threshold_ms: int = Field(default=200)
     
     @property
     def postgres_url(self) -> str:
@@ -0,0 +1,80 @@
+"""Monitor de latencia del event loop.
+
+Una tarea de fondo duerme ``interval`` segundos y mide cuánto tardó realmente
+en despertar; el exceso es el tiempo que el loop estuvo bloqueado por código
+síncrono. Si supera el umbral se registra en el log y se acumula en métricas
+expuestas por ``GET /health``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger("app.loop_monitor")
+
+
+class LoopLagMonitor:
+    def __init__(self, interval_ms: int = 500, threshold_ms: int = 200):
+        self.interval = max(interval_ms, 10) / 1000.0
+        self.threshold = max(threshold_ms, 1) / 1000.0
+        self.samples = 0
+        self.stalls = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_stall_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="loop-lag-monitor")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.record(lag)
+
+    def record(self, lag: float) -> None:
+        self.samples += 1
+        self.last_lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if lag >= self.threshold:
+            self.stalls += 1
+            self.last_stall_at = time.time()
+            logger.warning("Event loop bloqueado %.0f ms (umbral %.0f ms)", lag * 1000, self.threshold * 1000)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_ms": round(self.interval * 1000),
+            "threshold_ms": round(self.threshold * 1000),
+            "samples": self.samples,
+            "stalls": self.stalls,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "last_stall_at": self.last_stall_at,
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    interval_ms=settings.loop_lag_interval_ms,
+    threshold_ms=settings.loop_lag_threshold_ms,
+)
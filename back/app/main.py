@@ -3,8 +3,13 @@ from fastapi.middleware.cors import CORSMiddleware
 import logging
 
 from .core.config import settings
+from .core.loop_monitor import loop_monitor
 from .api.v1 import api_router
 from .database import Base, engine
+from .services.ingestion import resume_pending_jobs
+from .services.ai import close_http_session
+from .services.ai_async import close_async_client
+from .services.pdf_extraction import shutdown_pool
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
@@ -26,3 +31,26 @@ app.include_router(api_router, prefix=settings.api_prefix)
 def on_startup():
     # Crear tablas automáticamente en SQLite durante desarrollo
     Base.metadata.create_all(bind=engine)
+    # Retomar jobs de ingesta que quedaron a medias en un reinicio
+    resume_pending_jobs()
+
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    loop_monitor.start()
+
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    await loop_monitor.stop()
+
+
+@app.on_event("shutdown")
+def stop_pdf_pool():
+    shutdown_pool()
+
+
+@app.on_event("shutdown")
+async def close_ai_client():
+    close_http_session()
+    await close_async_client()
@@ -3,5 +3,7 @@ from .oit_document import OitDocument
 from .resource import Resource
 from .resource_booking import ResourceBooking
 from .notification import Notification
+from .oit_job import OitJob
+from .stored_file import StoredFile
 
-__all__ = ["SystemUser", "OitDocument", "Resource", "ResourceBooking", "Notification"]
+__all__ = ["SystemUser", "OitDocument", "Resource", "ResourceBooking", "Notification", "OitJob", "StoredFile"]
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, ForeignKey
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -9,13 +9,21 @@ class OitDocument(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)  # ruta relativa donde se guarda
     original_name = Column(String, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 del archivo (stored_files)
     status = Column(String, nullable=False, default="check")  # alerta|error|check
+    processing_status = Column(String, nullable=False, default="done")  # queued|extracting|reviewing|done|failed
+    partial = Column(Boolean, nullable=False, default=False)  # veredicto preliminar (primeras páginas)
     summary = Column(Text, nullable=True)
     alerts = Column(Text, nullable=True)   # JSON string
     missing = Column(Text, nullable=True)  # JSON string
     evidence = Column(Text, nullable=True) # JSON string
     compliance_bundle_path = Column(String, nullable=True)
     compliance_report_path = Column(String, nullable=True)
+    rules_version = Column(String, nullable=True)  # versión de reglas compliance aplicada
+    ai_model = Column(String, nullable=True)  # modelo IA usado en la revisión
+    ai_path = Column(String(16), nullable=True)  # sync|async_pending|async|skip (política de revisión IA)
+    sampling_schema = Column(Text, nullable=True)  # JSON del formulario de muestreo generado con IA
+    sampling_schema_key = Column(String, nullable=True)  # contenido:modelo con que se generó
     approval_status = Column(String, nullable=False, default="pending")
     approved_schedule_date = Column(DateTime, nullable=True)
     resource_plan = Column(Text, nullable=True)
@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy.orm import relationship, backref
+
+from ..database import Base
+
+
+class OitJob(Base):
+    __tablename__ = "oit_jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid hex
+    document_id = Column(Integer, ForeignKey("oit_documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String(50), nullable=False, default="ingest")
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued|extracting|reviewing|done|failed
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    document = relationship("OitDocument", backref=backref("jobs", cascade="all, delete-orphan"))
@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+
+from ..database import Base
+
+
+class StoredFile(Base):
+    """Archivo físico almacenado una sola vez por contenido (SHA-256)."""
+
+    __tablename__ = "stored_files"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)  # ruta relativa a back/
+    size = Column(Integer, nullable=False, default=0)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
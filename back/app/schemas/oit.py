@@ -14,6 +14,9 @@ class OitDocumentOut(BaseModel):
     filename: str
     original_name: Optional[str] = None
     status: str
+    processing_status: str = "done"
+    partial: bool = False
+    job_id: Optional[str] = None
     summary: Optional[str] = None
     alerts: List[str] = []
     missing: List[str] = []
@@ -31,7 +34,22 @@ class OitDocumentOut(BaseModel):
     resource_gaps: Optional[dict] = None
     approval_notes: Optional[str] = None
     review_notes: Optional[str] = None
+    ai_path: Optional[str] = None  # sync|async_pending|async|skip
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class OitJobOut(BaseModel):
+    id: str
+    document_id: int
+    kind: str
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
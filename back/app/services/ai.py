@@ -6,7 +6,7 @@ except Exception:
     requests = None  # type: ignore
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Literal
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Literal, Tuple
 
 # Import condicional de pypdf
 try:
@@ -15,14 +15,181 @@ except Exception:
     PdfReader = None  # type: ignore
 import logging
 import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ..core.config import settings
+from . import llm_cache
+from .ai_scheduler import AiPriority, OllamaBusy, scheduler
+from .circuit_breaker import CircuitBreaker, CircuitOpen
+from .reference_index import estimate_tokens, select_reference_text
+from .review_utils import merge_lists
 
 DEFAULT_OLLAMA_URL = "http://localhost:11434"
 DEFAULT_MODEL_NAME = "llama3.2:3b"
+# Reintentos de un fragmento cuando la cola de Ollama está llena
+CHUNK_BUSY_RETRIES = 3
 
 logger = logging.getLogger("oit.ai")
 
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_session():
+    """Sesión HTTP compartida por todas las instancias de ``OitAiService``.
+
+    Mantiene un pool de conexiones keep-alive hacia Ollama (``OLLAMA_POOL_SIZE``)
+    para no abrir una conexión TCP por cada llamada. ``None`` sin ``requests``.
+    """
+    global _session
+    if requests is None:  # type: ignore
+        return None
+    with _session_lock:
+        if _session is None:
+            from requests.adapters import HTTPAdapter  # type: ignore
+
+            session = requests.Session()  # type: ignore
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=max(1, settings.ollama_pool_size),
+                pool_block=False,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def close_http_session() -> None:
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+# Caché de /api/tags por servidor: base_url -> (instante de consulta, modelos)
+_models_cache: Dict[str, Tuple[float, List[Dict]]] = {}
+_models_refreshing: set = set()
+_models_lock = threading.Lock()
+
+
+def invalidate_models_cache(base_url: Optional[str] = None) -> None:
+    with _models_lock:
+        if base_url is None:
+            _models_cache.clear()
+        else:
+            _models_cache.pop(base_url.rstrip("/"), None)
+
+
+def _is_model_not_found(exc: Exception) -> bool:
+    response = getattr(exc, "response", None)
+    if response is not None and getattr(response, "status_code", None) == 404:
+        return True
+    return "not found" in str(exc).lower()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _is_backend_failure(exc: BaseException) -> bool:
+    # Cuentan timeouts, errores de conexión y 5xx; una respuesta 4xx o un cuerpo
+    # inválido muestran que el servidor está vivo
+    if isinstance(exc, (OllamaBusy, CircuitOpen, ValueError)):
+        return False
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status >= 500
+    return True
+
+
+def ollama_breaker(base_url: str) -> CircuitBreaker:
+    """Circuit breaker del servidor Ollama ``base_url`` (uno por servidor)."""
+    base_url = base_url.rstrip("/")
+    with _breakers_lock:
+        breaker = _breakers.get(base_url)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                f"ollama {base_url}",
+                failure_threshold=settings.ollama_breaker_failures,
+                cooldown_s=settings.ollama_breaker_cooldown_s,
+                probes=settings.ollama_breaker_probes,
+                is_failure=_is_backend_failure,
+            )
+            _breakers[base_url] = breaker
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, object]]:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {url: breaker.snapshot() for url, breaker in breakers.items()}
+
+
+def _cached_models(base_url: str) -> Tuple[Optional[List[Dict]], bool]:
+    """Modelos en caché utilizables (o ``None``) y si hay que refrescarlos en segundo plano."""
+    now = time.monotonic()
+    with _models_lock:
+        cached = _models_cache.get(base_url)
+        age = now - cached[0] if cached else None
+        if cached and age <= settings.ollama_models_ttl_s:
+            return cached[1], False
+        if cached is None or age > settings.ollama_models_max_stale_s:
+            return None, False
+        start_refresh = base_url not in _models_refreshing
+        _models_refreshing.add(base_url)
+    return cached[1], start_refresh
+
+
+def _store_models(base_url: str, models: List[Dict]) -> None:
+    with _models_lock:
+        _models_cache[base_url] = (time.monotonic(), models)
+        _models_refreshing.discard(base_url)
+
+
+def _store_models_failure(base_url: str) -> List[Dict]:
+    """Tras un ``/api/tags`` fallido conserva la última lista buena (``[]`` si nunca hubo).
+
+    Se renueva su marca de tiempo: el próximo intento llega al vencer el TTL en
+    lugar de esperar el timeout en cada llamada.
+    """
+    with _models_lock:
+        cached = _models_cache.get(base_url)
+        models = cached[1] if cached else []
+        _models_cache[base_url] = (time.monotonic(), models)
+        _models_refreshing.discard(base_url)
+    return models
+
+
+def _has_model(models: List[Dict], model: str) -> bool:
+    for m in models:
+        if isinstance(m, dict):
+            name = m.get("name") or m.get("model")
+        else:
+            name = str(m)
+        if name == model:
+            return True
+    return False
+
+
+def _timeout(read_timeout: Optional[float] = None):
+    # (conexión, lectura): un Ollama caído falla rápido sin recortar la generación
+    return (settings.ollama_connect_timeout_s, read_timeout or settings.ollama_read_timeout_s)
+
 class OitAiService:
-    def __init__(self, base_url: str = DEFAULT_OLLAMA_URL, model: str = DEFAULT_MODEL_NAME):
+    def __init__(
+        self,
+        base_url: str = DEFAULT_OLLAMA_URL,
+        model: str = DEFAULT_MODEL_NAME,
+        priority: AiPriority = AiPriority.INTERACTIVE,
+    ):
+        # Clase de prioridad de las generaciones en la cola hacia Ollama
+        self.priority = priority
         # Permitir sobreescribir por variables de entorno
         env_url = os.getenv("PARADIXE_OLLAMA_URL", base_url)
         env_model = os.getenv("PARADIXE_OLLAMA_MODEL", model)
@@ -30,49 +197,63 @@ class OitAiService:
         self.model = env_model
         self.force_fallback = os.getenv("PARADIXE_AI_FALLBACK", "false").lower() in ("1", "true", "yes")
         
-    def get_available_models(self) -> List[Dict]:
-        """Obtiene la lista de modelos disponibles en el servidor Ollama"""
+    def _fetch_models(self) -> List[Dict]:
+        """Consulta ``/api/tags`` en Ollama (lanza excepción si falla)."""
         url = f"{self.base_url}/api/tags"
+        session = http_session()
+        if session is not None:
+            resp = session.get(url, timeout=_timeout(10))
+            resp.raise_for_status()
+            data = resp.json()
+        else:
+            from urllib.request import Request, urlopen
+            import ssl
+
+            req = Request(url)
+            ctx = ssl.create_default_context()
+            with urlopen(req, timeout=10, context=ctx) as resp:  # type: ignore
+                body = resp.read().decode("utf-8", errors="ignore")
+            try:
+                data = json.loads(body) if body else {}
+            except Exception:
+                data = {}
+        models = data.get("models") or data.get("tags") or []
+        return models if isinstance(models, list) else []
+
+    def _refresh_models(self) -> List[Dict]:
         try:
-            if requests is not None:  # type: ignore
-                resp = requests.get(url, timeout=10)  # type: ignore
-                resp.raise_for_status()
-                data = resp.json()
-            else:
-                from urllib.request import Request, urlopen
-                from urllib.error import URLError, HTTPError
-                import ssl
-
-                req = Request(url)
-                ctx = ssl.create_default_context()
-                with urlopen(req, timeout=10, context=ctx) as resp:  # type: ignore
-                    body = resp.read().decode("utf-8", errors="ignore")
-                try:
-                    data = json.loads(body) if body else {}
-                except Exception:
-                    data = {}
-            models = data.get("models") or data.get("tags") or []
-            return models if isinstance(models, list) else []
+            models = self._fetch_models()
         except Exception as e:
             logger.warning(f"Error al obtener modelos disponibles: {e}")
-            return []
-            
+            return _store_models_failure(self.base_url)
+        _store_models(self.base_url, models)
+        return models
+
+    def get_available_models(self) -> List[Dict]:
+        """Obtiene la lista de modelos disponibles en el servidor Ollama.
+
+        Se sirve desde una caché por servidor: dentro de ``OLLAMA_MODELS_TTL_S``
+        no hay llamada; vencida (hasta ``OLLAMA_MODELS_MAX_STALE_S``) se devuelve
+        la lista anterior y se refresca en segundo plano.
+        """
+        cached, start_refresh = _cached_models(self.base_url)
+        if start_refresh:
+            threading.Thread(target=self._refresh_models, name="ollama-models", daemon=True).start()
+        if cached is not None:
+            return cached
+        return self._refresh_models()
+
     def is_model_available(self, model_name: Optional[str] = None) -> bool:
         """Verifica si un modelo específico está disponible"""
         if self.force_fallback:
             return False
+        if ollama_breaker(self.base_url).is_open():
+            # Circuito abierto: directo al fallback sin esperar timeouts
+            return False
             
         model = model_name or self.model
         try:
-            models = self.get_available_models()
-            for m in models:
-                if isinstance(m, dict):
-                    name = m.get("name") or m.get("model")
-                else:
-                    name = str(m)
-                if name == model:
-                    return True
-            return False
+            return _has_model(self.get_available_models(), model)
         except Exception:
             return False
 
@@ -109,12 +290,22 @@ class OitAiService:
             "notes": summary if missing else ""
         }
 
-    def _post_json(self, url: str, payload: Dict, timeout: int = 90) -> Dict:
-        """POST JSON usando requests si está disponible; si no, urllib estándar."""
-        if requests is not None:  # type: ignore
-            resp = requests.post(url, json=payload, timeout=timeout)  # type: ignore
+    def _post_json(self, url: str, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        """POST JSON usando la sesión compartida si hay requests; si no, urllib estándar.
+
+        ``timeout`` es el tiempo de lectura (por defecto ``OLLAMA_READ_TIMEOUT_S``).
+        Pasa por el circuit breaker del servidor (``CircuitOpen`` si está abierto).
+        """
+        with ollama_breaker(self.base_url).call():
+            return self._send_json(url, payload, timeout)
+
+    def _send_json(self, url: str, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        session = http_session()
+        if session is not None:
+            resp = session.post(url, json=payload, timeout=_timeout(timeout))
             resp.raise_for_status()
             return resp.json()
+        timeout = timeout or settings.ollama_read_timeout_s
         # Fallback stdlib
         try:
             from urllib.request import Request, urlopen
@@ -141,78 +332,32 @@ class OitAiService:
         except Exception as e:
             raise RuntimeError(f"Fallo al realizar POST: {e}")
 
-    def analyze(self, document_text: str, reference_text: str) -> Dict:
-        if self.force_fallback:
-            logger.info("Fallback IA forzado por PARADIXE_AI_FALLBACK; usando heurística")
-            return self._heuristic_review(document_text, reference_text)
+    def _generate(
+        self,
+        payload: Dict,
+        timeout: Optional[float] = None,
+        refresh: bool = False,
+        accept: Optional[Callable[[Dict], bool]] = None,
+    ) -> Dict:
+        """``/api/generate`` con caché para llamadas deterministas (temperature 0).
 
-        # Prompt estricto con contrato de salida JSON
-        prompt = (
-            "Eres un validador estricto de OIT. Debes analizar el DOCUMENTO usando las REFERENCIAS "
-            "y devolver EXCLUSIVAMENTE un objeto JSON válido que cumpla el siguiente esquema. "
-            "No agregues comentarios ni explicaciones fuera del JSON. Si algún campo no aplica, usa una cadena vacía o una lista vacía. "
-            "\n\n[SCHEMA]\n"
-            "{\n"
-            "  \"status\": \"check|alerta|error\",\n"
-            "  \"summary\": string,\n"
-            "  \"alerts\": string[],\n"
-            "  \"missing\": string[],\n"
-            "  \"evidence\": string[]\n"
-            "}\n\n"
-            "[REFERENCIAS]\n" + reference_text + "\n\n" +
-            "[DOCUMENTO]\n" + document_text + "\n\n" +
-            "Devuelve solo el JSON del esquema indicado, perfectamente validado."
-        )
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False,
-            # Forzar salida JSON con Ollama (cuando el servidor lo soporta)
-            "format": "json",
-            "options": {"temperature": 0.0, "num_ctx": 8192}
-        }
+        Las llamadas que sí llegan a Ollama pasan por el planificador con la
+        prioridad del servicio (``OllamaBusy`` si la cola está llena). Con
+        ``refresh`` no se lee la caché (la respuesta nueva la reemplaza) y, si se
+        pasa ``accept``, sólo se guardan las respuestas que lo cumplen.
+        """
         url = f"{self.base_url}/api/generate"
-        try:
-            logger.info(f"Llamando Ollama generate en {self.base_url} con modelo={self.model}")
-            data = self._post_json(url, payload, timeout=90)
-            raw = (data.get("response") or "").strip()
-            if not raw:
-                # Algunos servidores responden bajo otra clave o vacío
-                raw = json.dumps(data, ensure_ascii=False)
-            # Intentar parseo estricto de JSON
-            try:
-                parsed = json.loads(raw)
-            except json.JSONDecodeError:
-                # Intentar extraer el primer objeto JSON del texto
-                start = raw.find("{")
-                end = raw.rfind("}")
-                if start != -1 and end != -1:
-                    try:
-                        parsed = json.loads(raw[start:end+1])
-                    except Exception:
-                        logger.warning("Salida del modelo no es JSON; aplicando fallback heurístico")
-                        return self._heuristic_review(document_text, reference_text)
-                else:
-                    logger.warning("Salida del modelo no es JSON; aplicando fallback heurístico")
-                    return self._heuristic_review(document_text, reference_text)
-            # Validación mínima del contrato
-            def _ensure_list(v):
-                return v if isinstance(v, list) else ([] if v is None else [str(v)])
-            parsed.setdefault("status", "error")
-            parsed.setdefault("summary", "")
-            parsed.setdefault("notes", parsed.get("summary", ""))
-            parsed["alerts"] = _ensure_list(parsed.get("alerts"))
-            parsed["missing"] = _ensure_list(parsed.get("missing"))
-            parsed["evidence"] = _ensure_list(parsed.get("evidence"))
-            # Normalizar status
-            st = str(parsed.get("status", "")).lower()
-            if st not in ("check", "alerta", "error"):
-                parsed["status"] = "error"
-            logger.info("Respuesta IA válida (JSON) y normalizada")
-            return parsed
-        except Exception as e:
-            logger.warning(f"Fallo al invocar Ollama: {e}; aplicando fallback heurístico")
-            return self._heuristic_review(document_text, reference_text)
+        key = llm_cache.cache_key(url, payload)
+        if key is not None and not refresh:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                logger.info(f"Respuesta IA desde caché (modelo={payload.get('model')})")
+                return cached
+        with scheduler.slot(self.priority):
+            data = self._post_json(url, payload, timeout)
+        if key is not None and (data.get("response") or "").strip() and (accept is None or accept(data)):
+            llm_cache.put(key, data)
+        return data
 
     def chat(self, message: str, system_prompt: Optional[str] = None, model: Optional[str] = None) -> Dict[str, str]:
         """
@@ -229,53 +374,55 @@ class OitAiService:
         use_model = model or self.model
         
         if self.force_fallback or not self.is_model_available(use_model):
-            # Fallback mínimo
-            hint = message.strip()
-            if not hint:
-                hint = "(sin contenido)"
-            reply = (
-                f"(IA local no disponible - modelo {use_model}) Respuesta aproximada: he recibido tu mensaje y puedo ayudarte a resumir, "
-                f"analizar OITs y recomendar recursos. Por favor, indica tu duda específica. \n\nTexto: {hint[:500]}"
-            )
-            return {"reply": reply, "used_fallback": True}
+            return {"reply": self._fallback_reply(message, use_model), "used_fallback": True}
         
         # Intentar usar generate de Ollama como chat básico
-        default_system = "Eres un asistente útil y conciso para operaciones OIT. Responde en español."
-        sys_prompt = system_prompt or default_system
-        
-        payload = {
-            "model": use_model,
-            "prompt": f"[SISTEMA]: {sys_prompt}\n\n[USUARIO]: {message}",
-            "stream": False,
-            "options": {"temperature": 0.2, "num_ctx": 4096},
-        }
-        
+        payload = self._chat_payload(message, system_prompt, use_model, stream=False)
         url = f"{self.base_url}/api/generate"
         try:
-            data = self._post_json(url, payload, timeout=60)
+            with scheduler.slot(self.priority):
+                data = self._post_json(url, payload, timeout=60)
             reply = (data.get("response") or "").strip()
             if not reply:
                 raise RuntimeError("Respuesta vacía del modelo")
             return {"reply": reply, "used_fallback": False}
+        except OllamaBusy:
+            # El llamador decide (429 o fallback)
+            raise
         except Exception as e:
             logger.warning(f"Error al usar el modelo {use_model}: {e}")
-            # Fallback mínimo
-            hint = message.strip()
-            if not hint:
-                hint = "(sin contenido)"
-            reply = (
-                f"(IA local no disponible - modelo {use_model}) Respuesta aproximada: he recibido tu mensaje y puedo ayudarte a resumir, "
-                f"analizar OITs y recomendar recursos. Por favor, indica tu duda específica. \n\nTexto: {hint[:500]}"
-            )
-            return {"reply": reply, "used_fallback": True}
+            if _is_model_not_found(e):
+                invalidate_models_cache(self.base_url)
+            return {"reply": self._fallback_reply(message, use_model), "used_fallback": True}
+
+    def _chat_payload(self, message: str, system_prompt: Optional[str], model: str, stream: bool) -> Dict:
+        default_system = "Eres un asistente útil y conciso para operaciones OIT. Responde en español."
+        sys_prompt = system_prompt or default_system
+        return {
+            "model": model,
+            "prompt": f"[SISTEMA]: {sys_prompt}\n\n[USUARIO]: {message}",
+            "stream": stream,
+            "options": {"temperature": 0.2, "num_ctx": 4096},
+        }
+
+    @staticmethod
+    def _fallback_reply(message: str, model: str) -> str:
+        # Fallback mínimo
+        hint = message.strip()
+        if not hint:
+            hint = "(sin contenido)"
+        return (
+            f"(IA local no disponible - modelo {model}) Respuesta aproximada: he recibido tu mensaje y puedo ayudarte a resumir, "
+            f"analizar OITs y recomendar recursos. Por favor, indica tu duda específica. \n\nTexto: {hint[:500]}"
+        )
     
-    def check_document(self, document_text: str, reference_text: str, model: Optional[str] = None) -> Dict:
+    def check_document(self, document_text: str, reference_text: Optional[str] = None, model: Optional[str] = None) -> Dict:
         """
         Verifica un documento usando el modelo especificado.
         
         Args:
             document_text: Texto del documento a verificar
-            reference_text: Texto de referencia
+            reference_text: Texto de referencia (si es None, se eligen las referencias afines al texto)
             model: Modelo a utilizar (si es None, usa el modelo por defecto)
             
         Returns:
@@ -286,11 +433,41 @@ class OitAiService:
         if self.force_fallback or not self.is_model_available(use_model):
             logger.info(f"Modelo {use_model} no disponible o fallback forzado; usando heurística")
             return self._heuristic_review(document_text, reference_text)
+
+        # Documentos largos: por fragmentos, para no exceder el contexto del modelo
+        if estimate_tokens(document_text) > settings.ai_chunk_tokens:
+            chunks = split_document(document_text, settings.ai_chunk_tokens)
+            result = self._check_chunked(chunks, reference_text, use_model)
+            return result or self._heuristic_review(document_text, reference_text)
             
+        payload = self._review_payload(document_text, reference_text or select_reference_text(document_text), use_model)
+        try:
+            logger.info(f"Llamando Ollama generate en {self.base_url} con modelo={use_model}")
+            data = self._generate(payload)
+            return self._parse_review(data, document_text, reference_text)
+        except Exception as e:
+            logger.warning(f"Fallo al invocar Ollama con modelo {use_model}: {e}; aplicando fallback heurístico")
+            if _is_model_not_found(e):
+                # El modelo se eliminó del servidor: la caché de /api/tags quedó obsoleta
+                invalidate_models_cache(self.base_url)
+            return self._heuristic_review(document_text, reference_text)
+
+    @staticmethod
+    def _review_payload(document_text: str, reference_text: str, model: str, chunk: bool = False) -> Dict:
+        fragment = ""
+        document_label = "[DOCUMENTO]"
+        if chunk:
+            # Sin posición ni total: el prompt de un fragmento sólo depende de su texto y referencias
+            fragment = (
+                "El DOCUMENTO es un fragmento de un documento más largo: reporta las evidencias "
+                "y alertas de este fragmento y, en missing, sólo requisitos de las REFERENCIAS (con su texto literal) "
+                "que no aparezcan en él. "
+            )
+            document_label = "[DOCUMENTO - FRAGMENTO]"
         # Prompt estricto con contrato de salida JSON
         prompt = (
             "Eres un validador estricto de OIT. Debes analizar el DOCUMENTO usando las REFERENCIAS "
-            "y devolver EXCLUSIVAMENTE un objeto JSON válido que cumpla el siguiente esquema. "
+            "y devolver EXCLUSIVAMENTE un objeto JSON válido que cumpla el siguiente esquema. " + fragment +
             "No agregues comentarios ni explicaciones fuera del JSON. Si algún campo no aplica, usa una cadena vacía o una lista vacía. "
             "\n\n[SCHEMA]\n"
             "{\n"
@@ -301,62 +478,154 @@ class OitAiService:
             "  \"evidence\": string[]\n"
             "}\n\n"
             "[REFERENCIAS]\n" + reference_text + "\n\n" +
-            "[DOCUMENTO]\n" + document_text + "\n\n" +
+            document_label + "\n" + document_text + "\n\n" +
             "Devuelve solo el JSON del esquema indicado, perfectamente validado."
         )
-        
-        payload = {
-            "model": use_model,
+        return {
+            "model": model,
             "prompt": prompt,
             "stream": False,
             # Forzar salida JSON con Ollama (cuando el servidor lo soporta)
             "format": "json",
             "options": {"temperature": 0.0, "num_ctx": 8192}
         }
-        
-        url = f"{self.base_url}/api/generate"
+
+    def _parse_review(self, data: Dict, document_text: str, reference_text: str) -> Dict:
+        """Valida y normaliza la salida JSON del modelo; heurística si no es JSON."""
+        parsed = self._parse_review_json(data)
+        if parsed is None:
+            logger.warning("Salida del modelo no es JSON; aplicando fallback heurístico")
+            return self._heuristic_review(document_text, reference_text)
+        return parsed
+
+    @staticmethod
+    def _parse_review_json(data: Dict) -> Optional[Dict]:
+        """Resultado normalizado del modelo, o ``None`` si la salida no es JSON."""
+        raw = (data.get("response") or "").strip()
+        if not raw:
+            # Algunos servidores responden bajo otra clave o vacío
+            raw = json.dumps(data, ensure_ascii=False)
+        # Intentar parseo estricto de JSON
         try:
-            logger.info(f"Llamando Ollama generate en {self.base_url} con modelo={use_model}")
-            data = self._post_json(url, payload, timeout=90)
-            raw = (data.get("response") or "").strip()
-            if not raw:
-                # Algunos servidores responden bajo otra clave o vacío
-                raw = json.dumps(data, ensure_ascii=False)
-            # Intentar parseo estricto de JSON
+            parsed = json.loads(raw)
+        except json.JSONDecodeError:
+            # Intentar extraer el primer objeto JSON del texto
+            start = raw.find("{")
+            end = raw.rfind("}")
+            if start == -1 or end == -1:
+                return None
             try:
-                parsed = json.loads(raw)
-            except json.JSONDecodeError:
-                # Intentar extraer el primer objeto JSON del texto
-                start = raw.find("{")
-                end = raw.rfind("}")
-                if start != -1 and end != -1:
-                    try:
-                        parsed = json.loads(raw[start:end+1])
-                    except Exception:
-                        logger.warning("Salida del modelo no es JSON; aplicando fallback heurístico")
-                        return self._heuristic_review(document_text, reference_text)
-                else:
-                    logger.warning("Salida del modelo no es JSON; aplicando fallback heurístico")
-                    return self._heuristic_review(document_text, reference_text)
-            # Validación mínima del contrato
-            def _ensure_list(v):
-                return v if isinstance(v, list) else ([] if v is None else [str(v)])
-            parsed.setdefault("status", "error")
-            parsed.setdefault("summary", "")
-            parsed["alerts"] = _ensure_list(parsed.get("alerts"))
-            parsed["missing"] = _ensure_list(parsed.get("missing"))
-            parsed["evidence"] = _ensure_list(parsed.get("evidence"))
-            # Normalizar status
-            st = str(parsed.get("status", "")).lower()
-            if st not in ("check", "alerta", "error"):
-                parsed["status"] = "error"
-            logger.info("Respuesta IA válida (JSON) y normalizada")
-            return parsed
+                parsed = json.loads(raw[start:end+1])
+            except Exception:
+                return None
+        if not isinstance(parsed, dict):
+            return None
+        # Validación mínima del contrato
+        def _ensure_list(v):
+            return v if isinstance(v, list) else ([] if v is None else [str(v)])
+        parsed.setdefault("status", "error")
+        parsed.setdefault("summary", "")
+        parsed["alerts"] = _ensure_list(parsed.get("alerts"))
+        parsed["missing"] = _ensure_list(parsed.get("missing"))
+        parsed["evidence"] = _ensure_list(parsed.get("evidence"))
+        # Normalizar status
+        st = str(parsed.get("status", "")).lower()
+        if st not in ("check", "alerta", "error"):
+            parsed["status"] = "error"
+        logger.info("Respuesta IA válida (JSON) y normalizada")
+        return parsed
+
+    def _review_chunk(self, text: str, reference_text: Optional[str], model: str, index: int) -> Optional[Dict]:
+        """Revisión del fragmento ``index``; ``None`` si falla.
+
+        Sin referencias explícitas se eligen las del propio fragmento, así su
+        prompt (y su entrada en la caché IA) no cambia si se edita otra parte
+        del documento. Si la cola de Ollama está llena se reintenta tras ``retry_after``.
+        """
+        payload = self._review_payload(text, reference_text or select_reference_text(text), model, chunk=True)
+        try:
+            for attempt in range(CHUNK_BUSY_RETRIES + 1):
+                try:
+                    data = self._generate(payload)
+                    break
+                except OllamaBusy as e:
+                    if attempt == CHUNK_BUSY_RETRIES:
+                        raise
+                    time.sleep(e.retry_after)
+            result = self._parse_review_json(data)
         except Exception as e:
-            logger.warning(f"Fallo al invocar Ollama con modelo {use_model}: {e}; aplicando fallback heurístico")
-            return self._heuristic_review(document_text, reference_text)
+            logger.warning(f"Fallo la revisión IA del fragmento {index}: {e}")
+            if _is_model_not_found(e):
+                invalidate_models_cache(self.base_url)
+            return None
+        if result is not None:
+            result["part"] = index
+        return result
+
+    def _check_chunked(self, chunks: Iterable[str], reference_text: Optional[str], model: str) -> Optional[Dict]:
+        """Map-reduce: revisa hasta ``AI_CHUNK_WORKERS`` fragmentos a la vez y combina los resultados.
+
+        ``chunks`` se consume a medida que se libera un worker, así sólo los
+        fragmentos en revisión están en memoria. ``None`` si algún fragmento no
+        se pudo revisar: un veredicto parcial no se reporta como si cubriera
+        todo el documento.
+        """
+        workers = max(1, settings.ai_chunk_workers)
+        results: List[Optional[Dict]] = []
+        total = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-chunk") as pool:
+            running: set = set()
+            for index, text in enumerate(chunks, 1):
+                if len(running) >= workers:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+                    if None in results:
+                        break
+                running.add(pool.submit(self._review_chunk, text, reference_text, model, index))
+                total = index
+            results.extend(future.result() for future in wait(running).done)
+        reviewed = sorted((r for r in results if r is not None), key=lambda r: r["part"])
+        logger.info(f"Revisión IA por fragmentos: {total} fragmentos con modelo={model}")
+        if len(reviewed) < total:
+            logger.warning(
+                f"Sólo {len(reviewed)} de {total} fragmentos pudieron revisarse con IA; aplicando fallback heurístico"
+            )
+            return None
+        return merge_reviews(reviewed, total)
+
+    def check_pages(self, open_pages: Callable[[], Iterable[str]], model: Optional[str] = None) -> Dict:
+        """``check_document`` de un documento guardado, sin armar su texto completo en memoria.
+
+        ``open_pages`` devuelve un iterador nuevo de las páginas en cada llamada.
+        Un documento que entra en ``AI_CHUNK_TOKENS`` se revisa de una pasada; uno
+        más largo, por fragmentos que se cortan a medida que se leen las páginas.
+        La heurística de respaldo mira los primeros ``AI_DOCUMENT_MAX_CHARS``.
+        """
+        use_model = model or self.model
+        budget = settings.ai_chunk_tokens * 4
+        head: List[str] = []
+        size = 0
+        for page in open_pages():
+            head.append(page)
+            size += len(page) + 1
+            if size > budget:
+                break
+        else:
+            return self.check_document("\n".join(head).strip(), None, use_model)
+
+        result = None
+        if self.force_fallback or not self.is_model_available(use_model):
+            logger.info(f"Modelo {use_model} no disponible o fallback forzado; usando heurística")
+        else:
+            result = self._check_chunked(
+                iter_document_chunks(open_pages(), settings.ai_chunk_tokens), None, use_model
+            )
+        if result is None:
+            excerpt = document_excerpt(open_pages(), settings.ai_document_max_chars)
+            result = self._heuristic_review(excerpt, "")
+        return result
     
-    def analyze(self, document_text: str, reference_text: str) -> Dict:
+    def analyze(self, document_text: str, reference_text: Optional[str] = None) -> Dict:
         """Método de compatibilidad que llama a check_document con el modelo por defecto"""
         return self.check_document(document_text, reference_text)
 
@@ -424,29 +693,167 @@ class OitAiService:
         }
 
 
-def extract_text(file_path: Path) -> str:
+TEXT_BLOCK_CHARS = 64 * 1024
+
+
+def stream_stats(model: str, started: float, first_token: Optional[float], final: Dict, used_fallback: bool) -> Dict:
+    """Evento final de un chat en streaming: tiempos propios y conteos de Ollama."""
+    eval_duration = final.get("eval_duration") or 0
+    eval_count = final.get("eval_count") or 0
+    return {
+        "type": "done",
+        "model": model,
+        "used_fallback": used_fallback,
+        "elapsed_ms": round((time.monotonic() - started) * 1000),
+        "first_token_ms": round((first_token - started) * 1000) if first_token is not None else None,
+        "prompt_tokens": final.get("prompt_eval_count"),
+        "completion_tokens": final.get("eval_count"),
+        # Duraciones de Ollama en nanosegundos
+        "total_duration_ms": round(final["total_duration"] / 1e6) if final.get("total_duration") else None,
+        "tokens_per_s": round(eval_count / (eval_duration / 1e9), 2) if eval_duration else None,
+    }
+
+
+def _iter_text_file(file_path: Path) -> Iterator[str]:
+    # Bloques cortados en fin de línea: unirlos con "\n" reproduce el archivo
+    with file_path.open("r", encoding="utf-8", errors="ignore") as fh:
+        block: List[str] = []
+        size = 0
+        for line in fh:
+            block.append(line)
+            size += len(line)
+            if size >= TEXT_BLOCK_CHARS:
+                yield "".join(block).removesuffix("\n")
+                block, size = [], 0
+        if block:
+            yield "".join(block).removesuffix("\n")
+
+
+def iter_extracted_pages(file_path: Path, parallel: Optional[bool] = None, status=None) -> Iterator[str]:
+    """Genera el texto del archivo por páginas (PDF) o bloques (texto plano).
+
+    Nunca materializa el documento completo; los errores de lectura terminan
+    el generador sin lanzar excepción, igual que ``extract_text``. Si se pasa
+    un ``pdf_extraction.ExtractionStatus``, queda incompleto cuando se perdió
+    texto por un error o un plazo vencido.
+    """
     suffix = file_path.suffix.lower()
-    if suffix == ".pdf":
-        if PdfReader is None:
-            # Librería no disponible, intentar leer como texto o retornar vacío
-            try:
-                return file_path.read_text(encoding="utf-8", errors="ignore")
-            except Exception:
-                return ""
-        try:
-            reader = PdfReader(str(file_path))
-            text = "\n".join([p.extract_text() or "" for p in reader.pages])
-            return text.strip()
-        except Exception:
-            return ""
-    # Fallback: tratar como texto
     try:
-        return file_path.read_text(encoding="utf-8", errors="ignore")
-    except Exception:
-        try:
-            return file_path.read_text(encoding="latin-1", errors="ignore")
-        except Exception:
-            return ""
+        if suffix == ".pdf" and PdfReader is not None:
+            # Extracción por páginas (en paralelo para PDF grandes)
+            from .pdf_extraction import iter_pdf_pages
+
+            yield from iter_pdf_pages(file_path, parallel=parallel, status=status)
+            return
+        # Sin pypdf o no-PDF: tratar como texto
+        yield from _iter_text_file(file_path)
+    except Exception as exc:
+        logger.warning(f"No se pudo extraer texto de {file_path.name}: {exc}")
+        if status is not None:
+            status.complete = False
+
+
+def extract_text(file_path: Path) -> str:
+    return "\n".join(iter_extracted_pages(file_path)).strip()
+
+
+_SECTION_RE = re.compile(r"^\s*(?:#{1,6}\s+\S|\d+(?:\.\d+)*[.)]?\s+[A-ZÁÉÍÓÚÑ]|[A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ0-9 ,.:/()-]{3,}$)")
+
+
+def _split_units(text: str, max_tokens: int) -> List[str]:
+    # Párrafos; los que exceden el presupuesto se parten por líneas (y éstas por caracteres)
+    units: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            line = line.strip()
+            step = max_tokens * 4
+            units.extend(line[i:i + step] for i in range(0, len(line), step))
+    return units
+
+
+def iter_document_chunks(pages: Iterable[str], max_tokens: int) -> Iterator[str]:
+    """Corta el documento en fragmentos de hasta ``max_tokens`` en límites de sección.
+
+    Las páginas se leen de a una y cada fragmento se emite apenas se cierra.
+    Los cortes dependen del contenido (encabezados y un hash del párrafo) y no
+    sólo de la posición: editar una sección cambia su fragmento y a lo sumo los
+    siguientes hasta el próximo corte natural; el resto conserva el mismo texto
+    y, con él, su respuesta en la caché de IA.
+    """
+    current: List[str] = []
+    size = 0
+    for page in pages:
+        for unit in _split_units(page, max_tokens):
+            tokens = estimate_tokens(unit)
+            if current and (size + tokens > max_tokens or (size >= max_tokens // 2 and _SECTION_RE.match(unit))):
+                yield "\n".join(current)
+                current, size = [], 0
+            current.append(unit)
+            size += tokens
+            if size >= max_tokens // 2 and zlib.crc32(unit.encode("utf-8")) % 4 == 0:
+                yield "\n".join(current)
+                current, size = [], 0
+    if current:
+        yield "\n".join(current)
+
+
+def split_document(text: str, max_tokens: int) -> List[str]:
+    """Fragmentos de un texto ya en memoria (ver ``iter_document_chunks``)."""
+    return list(iter_document_chunks([text], max_tokens))
+
+
+def merge_reviews(results: List[Dict], total_parts: int) -> Dict:
+    """Combina las revisiones por fragmento en un solo veredicto.
+
+    Alertas y evidencias se unen sin duplicados (``merge_lists``). Un requisito
+    sólo falta si lo reportan como faltante todos los fragmentos revisados: si
+    aparece en alguno, el documento lo contiene.
+    """
+    alerts = merge_lists(*(r["alerts"] for r in results))
+    evidence = merge_lists(*(r["evidence"] for r in results))
+    missing_sets = [set(r["missing"]) for r in results]
+    missing = [item for item in merge_lists(*(r["missing"] for r in results)) if all(item in s for s in missing_sets)]
+    if missing:
+        status = "error"
+    elif alerts or any(r.get("status") == "alerta" for r in results):
+        status = "alerta"
+    else:
+        status = "check"
+    summary = (
+        f"Revisión IA en {len(results)} de {total_parts} fragmentos: {len(evidence)} evidencias, "
+        f"{len(missing)} faltantes, {len(alerts)} alertas."
+    )
+    notes = "\n".join(
+        f"Fragmento {r.get('part', index)}: {r['summary']}" for index, r in enumerate(results, 1) if r.get("summary")
+    )
+    return {
+        "status": status,
+        "summary": summary,
+        "alerts": alerts,
+        "missing": missing,
+        "evidence": evidence,
+        "notes": notes or summary,
+        "chunks": total_parts,
+    }
+
+
+def document_excerpt(pages: Iterable[str], max_chars: int) -> str:
+    """Consume páginas hasta ``max_chars`` para armar el prompt del modelo."""
+    parts: List[str] = []
+    remaining = max_chars
+    for page in pages:
+        if remaining <= 0:
+            break
+        chunk = page[:remaining]
+        parts.append(chunk)
+        remaining -= len(chunk) + 1
+    return "\n".join(parts).strip()
 
 
 def load_reference_text() -> str:
@@ -0,0 +1,320 @@
+"""Variante asíncrona de ``OitAiService`` sobre ``httpx.AsyncClient``.
+
+Mismo contrato que el servicio síncrono (``analyze``, ``chat``,
+``check_document``, ``get_available_models``), pero cada llamada a Ollama
+espera en el event loop en lugar de ocupar un hilo del threadpool, así las
+generaciones en curso no compiten con los endpoints CRUD. Comparte con el
+servicio síncrono los prompts, la caché de ``/api/tags`` y la caché de
+respuestas. Sin ``httpx`` instalado delega en el servicio síncrono dentro del
+threadpool.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+# Import condicional de httpx para no romper si no está instalado
+try:
+    import httpx  # type: ignore
+except Exception:
+    httpx = None  # type: ignore
+
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from . import llm_cache
+from .ai import (
+    CHUNK_BUSY_RETRIES,
+    DEFAULT_MODEL_NAME,
+    DEFAULT_OLLAMA_URL,
+    OitAiService,
+    _cached_models,
+    _has_model,
+    _is_model_not_found,
+    _store_models,
+    _store_models_failure,
+    invalidate_models_cache,
+    merge_reviews,
+    ollama_breaker,
+    split_document,
+    stream_stats,
+)
+from .ai_scheduler import AiPriority, OllamaBusy, scheduler
+from .reference_index import estimate_tokens, select_reference_text
+
+logger = logging.getLogger("oit.ai")
+
+_client = None
+_client_loop = None
+_background: set = set()
+
+
+def _timeout(read_timeout: Optional[float] = None):
+    # Sin límite para esperar conexión libre del pool: las llamadas en cola sólo cuestan una corrutina
+    return httpx.Timeout(
+        read_timeout or settings.ollama_read_timeout_s,
+        connect=settings.ollama_connect_timeout_s,
+        pool=None,
+    )
+
+
+def async_client():
+    """Cliente httpx compartido para el event loop actual (``None`` sin httpx).
+
+    Como la sesión síncrona, mantiene hasta ``OLLAMA_POOL_SIZE`` conexiones
+    keep-alive hacia Ollama; las llamadas que excedan el pool esperan turno.
+    """
+    global _client, _client_loop
+    if httpx is None:  # type: ignore
+        return None
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        size = max(1, settings.ollama_pool_size)
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=size, max_keepalive_connections=size),
+            timeout=_timeout(),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_async_client() -> None:
+    global _client, _client_loop
+    client, _client, _client_loop = _client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+class AsyncOitAiService:
+    def __init__(
+        self,
+        base_url: str = DEFAULT_OLLAMA_URL,
+        model: str = DEFAULT_MODEL_NAME,
+        priority: AiPriority = AiPriority.INTERACTIVE,
+    ):
+        # Configuración (URL, modelo, fallback forzado) y lógica sin E/S del servicio síncrono
+        self.sync = OitAiService(base_url, model, priority)
+        self.priority = priority
+        self.base_url = self.sync.base_url
+        self.model = self.sync.model
+        self.force_fallback = self.sync.force_fallback
+
+    async def _fetch_models(self) -> List[Dict]:
+        """Consulta ``/api/tags`` en Ollama (lanza excepción si falla)."""
+        resp = await async_client().get(f"{self.base_url}/api/tags", timeout=_timeout(10))
+        resp.raise_for_status()
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        models = data.get("models") or data.get("tags") or []
+        return models if isinstance(models, list) else []
+
+    async def _refresh_models(self) -> List[Dict]:
+        try:
+            models = await self._fetch_models()
+        except Exception as e:
+            logger.warning(f"Error al obtener modelos disponibles: {e}")
+            return _store_models_failure(self.base_url)
+        _store_models(self.base_url, models)
+        return models
+
+    async def get_available_models(self) -> List[Dict]:
+        """Modelos disponibles en Ollama, con la misma caché que el servicio síncrono."""
+        if httpx is None:  # type: ignore
+            return await run_in_threadpool(self.sync.get_available_models)
+        cached, start_refresh = _cached_models(self.base_url)
+        if start_refresh:
+            task = asyncio.get_running_loop().create_task(self._refresh_models())
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+        if cached is not None:
+            return cached
+        return await self._refresh_models()
+
+    async def is_model_available(self, model_name: Optional[str] = None) -> bool:
+        if self.force_fallback or ollama_breaker(self.base_url).is_open():
+            return False
+        try:
+            return _has_model(await self.get_available_models(), model_name or self.model)
+        except Exception:
+            return False
+
+    async def _post_json(self, url: str, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        with ollama_breaker(self.base_url).call():
+            resp = await async_client().post(url, json=payload, timeout=_timeout(timeout))
+            resp.raise_for_status()
+        try:
+            return resp.json()
+        except ValueError:
+            # Algunos modelos devuelven texto plano; encapsular
+            return {"response": resp.text}
+
+    async def _generate(self, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        """``/api/generate`` con la caché de respuestas deterministas."""
+        url = f"{self.base_url}/api/generate"
+        key = llm_cache.cache_key(url, payload)
+        if key is not None:
+            cached = await run_in_threadpool(llm_cache.get, key)
+            if cached is not None:
+                logger.info(f"Respuesta IA desde caché (modelo={payload.get('model')})")
+                return cached
+        async with scheduler.slot_async(self.priority):
+            data = await self._post_json(url, payload, timeout)
+        if key is not None and (data.get("response") or "").strip():
+            await run_in_threadpool(llm_cache.put, key, data)
+        return data
+
+    async def check_document(
+        self, document_text: str, reference_text: Optional[str] = None, model: Optional[str] = None
+    ) -> Dict:
+        """Verifica un documento usando el modelo especificado (ver ``OitAiService.check_document``)."""
+        if httpx is None:  # type: ignore
+            return await run_in_threadpool(self.sync.check_document, document_text, reference_text, model)
+        use_model = model or self.model
+        if not await self.is_model_available(use_model):
+            logger.info(f"Modelo {use_model} no disponible o fallback forzado; usando heurística")
+            return self.sync._heuristic_review(document_text, reference_text)
+
+        if estimate_tokens(document_text) > settings.ai_chunk_tokens:
+            return await self._check_chunked(document_text, reference_text, use_model)
+
+        references = reference_text or await run_in_threadpool(select_reference_text, document_text)
+        payload = self.sync._review_payload(document_text, references, use_model)
+        try:
+            logger.info(f"Llamando Ollama generate en {self.base_url} con modelo={use_model}")
+            data = await self._generate(payload)
+            return self.sync._parse_review(data, document_text, reference_text)
+        except Exception as e:
+            logger.warning(f"Fallo al invocar Ollama con modelo {use_model}: {e}; aplicando fallback heurístico")
+            if _is_model_not_found(e):
+                invalidate_models_cache(self.base_url)
+            return self.sync._heuristic_review(document_text, reference_text)
+
+    async def _review_chunk(self, text: str, reference_text: Optional[str], model: str, index: int) -> Optional[Dict]:
+        references = reference_text or await run_in_threadpool(select_reference_text, text)
+        payload = self.sync._review_payload(text, references, model, chunk=True)
+        try:
+            for attempt in range(CHUNK_BUSY_RETRIES + 1):
+                try:
+                    data = await self._generate(payload)
+                    break
+                except OllamaBusy as e:
+                    if attempt == CHUNK_BUSY_RETRIES:
+                        raise
+                    await asyncio.sleep(e.retry_after)
+            result = self.sync._parse_review_json(data)
+        except Exception as e:
+            logger.warning(f"Fallo la revisión IA del fragmento {index}: {e}")
+            if _is_model_not_found(e):
+                invalidate_models_cache(self.base_url)
+            return None
+        if result is not None:
+            result["part"] = index
+        return result
+
+    async def _check_chunked(self, document_text: str, reference_text: Optional[str], model: str) -> Dict:
+        """Map-reduce como ``OitAiService._check_chunked``: hasta ``AI_CHUNK_WORKERS`` fragmentos a la vez."""
+        parts = split_document(document_text, settings.ai_chunk_tokens)
+        logger.info(f"Revisión IA por fragmentos: {len(parts)} fragmentos con modelo={model}")
+        # Sin este límite todos los fragmentos entrarían juntos a la cola de Ollama
+        limit = asyncio.Semaphore(max(1, settings.ai_chunk_workers))
+
+        async def _review(index: int, text: str) -> Optional[Dict]:
+            async with limit:
+                return await self._review_chunk(text, reference_text, model, index)
+
+        results = await asyncio.gather(*(_review(index, text) for index, text in enumerate(parts, 1)))
+        reviewed = [r for r in results if r is not None]
+        if len(reviewed) < len(parts):
+            logger.warning(
+                f"Sólo {len(reviewed)} de {len(parts)} fragmentos pudieron revisarse con IA; aplicando fallback heurístico"
+            )
+            return self.sync._heuristic_review(document_text, reference_text)
+        return merge_reviews(reviewed, len(parts))
+
+    async def analyze(self, document_text: str, reference_text: Optional[str] = None) -> Dict:
+        return await self.check_document(document_text, reference_text)
+
+    async def chat(self, message: str, system_prompt: Optional[str] = None, model: Optional[str] = None) -> Dict[str, str]:
+        """Consulta de chat (ver ``OitAiService.chat``)."""
+        if httpx is None:  # type: ignore
+            return await run_in_threadpool(self.sync.chat, message, system_prompt, model)
+        use_model = model or self.model
+        if not await self.is_model_available(use_model):
+            return {"reply": self.sync._fallback_reply(message, use_model), "used_fallback": True}
+
+        payload = self.sync._chat_payload(message, system_prompt, use_model, stream=False)
+        try:
+            async with scheduler.slot_async(self.priority):
+                data = await self._post_json(f"{self.base_url}/api/generate", payload, timeout=60)
+            reply = (data.get("response") or "").strip()
+            if not reply:
+                raise RuntimeError("Respuesta vacía del modelo")
+            return {"reply": reply, "used_fallback": False}
+        except OllamaBusy:
+            # El llamador decide (429 o fallback)
+            raise
+        except Exception as e:
+            logger.warning(f"Error al usar el modelo {use_model}: {e}")
+            if _is_model_not_found(e):
+                invalidate_models_cache(self.base_url)
+            return {"reply": self.sync._fallback_reply(message, use_model), "used_fallback": True}
+
+    async def stream_chat(
+        self, message: str, system_prompt: Optional[str] = None, model: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """Chat en streaming: eventos ``token`` a medida que Ollama genera y un ``done`` final (``stream_stats``).
+
+        Si quien consume el iterador lo abandona (o su tarea se cancela), la
+        respuesta HTTP se cierra y Ollama detiene la generación.
+        """
+        started = time.monotonic()
+        use_model = model or self.model
+        if httpx is None or not await self.is_model_available(use_model):  # type: ignore
+            result = await self.chat(message, system_prompt, use_model)
+            yield {"type": "token", "text": result["reply"]}
+            yield stream_stats(use_model, started, None, {}, used_fallback=result.get("used_fallback", True))
+            return
+
+        payload = self.sync._chat_payload(message, system_prompt, use_model, stream=True)
+        first_token: Optional[float] = None
+        final: Dict = {}
+        # Cupo del planificador durante toda la generación; OllamaBusy sale antes del primer evento
+        await scheduler.acquire_async(self.priority)
+        try:
+            with ollama_breaker(self.base_url).call():
+                async with async_client().stream(
+                    "POST", f"{self.base_url}/api/generate", json=payload, timeout=_timeout(60)
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise RuntimeError(chunk["error"])
+                        text = chunk.get("response") or ""
+                        if text:
+                            if first_token is None:
+                                first_token = time.monotonic()
+                            yield {"type": "token", "text": text}
+                        if chunk.get("done"):
+                            final = chunk
+                            break
+        except Exception as e:
+            logger.warning(f"Error en chat en streaming con el modelo {use_model}: {e}")
+            if _is_model_not_found(e):
+                invalidate_models_cache(self.base_url)
+            if first_token is None:
+                yield {"type": "token", "text": self.sync._fallback_reply(message, use_model)}
+                yield stream_stats(use_model, started, None, {}, used_fallback=True)
+            else:
+                yield {"type": "error", "detail": "Se interrumpió la respuesta del modelo"}
+            return
+        finally:
+            scheduler.release()
+        yield stream_stats(use_model, started, first_token, final, used_fallback=False)
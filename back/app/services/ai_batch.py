@@ -0,0 +1,208 @@
+"""Revisión IA de lotes de documentos (auditorías masivas).
+
+Los documentos del lote se revisan de a ``AI_BATCH_CONCURRENCY`` a la vez con
+prioridad de fondo en el planificador de Ollama, así un lote grande no desplaza
+al chat ni a las revisiones de subidas. Cada resultado se entrega apenas
+termina, en el orden en que terminan, identificado por ``id``; un documento que
+falla produce su línea de error sin cortar el lote. Como las revisiones son
+deterministas quedan en la caché IA: reenviar un lote interrumpido (o pasar
+los ``id`` ya recibidos en ``skip_ids``) sólo procesa lo que faltaba.
+
+Los lotes pueden venir como lista JSON o como un archivo ``.zip``/``.tar(.gz)``
+con documentos ``.txt``, ``.md`` o ``.pdf``: los miembros se copian a disco en
+una sola pasada sobre el archivo y el texto de cada uno se extrae recién cuando
+le toca revisarse.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import shutil
+import tarfile
+import tempfile
+import time
+import uuid
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import IO, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from .ai import extract_text
+from .ai_async import AsyncOitAiService
+from .ai_scheduler import AiPriority
+
+logger = logging.getLogger("oit.ai_batch")
+
+ARCHIVE_SUFFIXES = {".txt", ".md", ".pdf"}
+
+
+class BatchRejected(ValueError):
+    """El lote o el archivo comprimido no se puede procesar."""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class BatchDocument:
+    id: str
+    # Texto ya disponible o función (bloqueante) que lo obtiene al revisarse
+    text: Optional[str] = None
+    load: Optional[Callable[[], str]] = None
+    reference_text: Optional[str] = None
+
+
+def _member_name(name: str) -> Optional[str]:
+    path = PurePosixPath(name)
+    if path.suffix.lower() not in ARCHIVE_SUFFIXES:
+        return None
+    # Ignorar metadatos de macOS y archivos ocultos
+    if any(part.startswith(".") or part == "__MACOSX" for part in path.parts):
+        return None
+    return path.as_posix()
+
+
+def _copy_member(src: IO[bytes], name: str, work_dir: Path) -> Path:
+    target = work_dir / f"{uuid.uuid4().hex}{PurePosixPath(name).suffix.lower()}"
+    with src, target.open("wb") as dst:
+        shutil.copyfileobj(src, dst)
+    return target
+
+
+def _read_member(path: Path) -> str:
+    """Texto de un miembro ya copiado a disco (el archivo se borra al terminar)."""
+    try:
+        return extract_text(path)
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def archive_documents(archive_path: Path, work_dir: Path) -> List[BatchDocument]:
+    """Documentos del archivo comprimido (``id`` = ruta del miembro).
+
+    Los miembros soportados se copian a ``work_dir`` recorriendo el archivo una
+    sola vez (un ``.tar.gz`` se descomprime una vez por lote); el texto se
+    extrae al revisarse. Lanza ``BatchRejected`` si no es un ``.zip``/``.tar``
+    válido o si no hay documentos soportados, y con 413 si un miembro
+    descomprimido excede ``UPLOAD_MAX_BYTES``, si hay más de
+    ``AI_BATCH_MAX_DOCUMENTS`` documentos o si en total exceden
+    ``AI_BATCH_MAX_ARCHIVE_BYTES``. Los límites se controlan con los tamaños
+    declarados en los encabezados, antes de copiar cada miembro.
+    """
+    max_bytes = settings.upload_max_bytes
+    max_documents = settings.ai_batch_max_documents
+    max_total = settings.ai_batch_max_archive_bytes
+    paths: Dict[str, Path] = {}
+    seen = {"documents": 0, "bytes": 0}
+
+    def _check_size(name: str, size: int) -> None:
+        if max_bytes and size > max_bytes:
+            raise BatchRejected(f"{name} excede el tamaño máximo de {max_bytes} bytes", 413)
+        seen["documents"] += 1
+        seen["bytes"] += size
+        if max_documents and seen["documents"] > max_documents:
+            raise BatchRejected(f"El archivo excede el máximo de {max_documents} documentos por lote", 413)
+        if max_total and seen["bytes"] > max_total:
+            raise BatchRejected(f"El archivo excede el tamaño descomprimido máximo de {max_total} bytes", 413)
+
+    try:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as zf:
+                members: Dict[str, zipfile.ZipInfo] = {}
+                for info in zf.infolist():
+                    name = None if info.is_dir() else _member_name(info.filename)
+                    if name and name not in members:
+                        _check_size(name, info.file_size)
+                        members[name] = info
+                # Todos los límites ya se controlaron con el directorio central;
+                # se extrae con el ZipInfo original: el nombre normalizado sólo es el id
+                for name, info in members.items():
+                    paths[name] = _copy_member(zf.open(info), name, work_dir)
+        elif tarfile.is_tarfile(archive_path):
+            with tarfile.open(archive_path) as tf:
+                for info in tf:
+                    name = _member_name(info.name) if info.isfile() else None
+                    if not name or name in paths:
+                        continue
+                    _check_size(name, info.size)
+                    src = tf.extractfile(info)
+                    if src is not None:
+                        paths[name] = _copy_member(src, name, work_dir)
+        else:
+            raise BatchRejected("El archivo debe ser .zip o .tar(.gz)")
+    except (zipfile.BadZipFile, tarfile.TarError) as exc:
+        raise BatchRejected(f"Archivo comprimido inválido: {exc}") from exc
+    if not paths:
+        raise BatchRejected("El archivo no contiene documentos .txt, .md o .pdf")
+    return [
+        BatchDocument(id=name, load=lambda path=path: _read_member(path))
+        for name, path in sorted(paths.items())
+    ]
+
+
+def batch_work_dir() -> Path:
+    return Path(tempfile.mkdtemp(prefix="oit-batch-"))
+
+
+async def _review(ai: AsyncOitAiService, item: BatchDocument, reference_text: Optional[str], model: Optional[str]) -> Dict:
+    started = time.monotonic()
+    try:
+        text = item.text if item.load is None else await run_in_threadpool(item.load)
+        if not (text or "").strip():
+            raise BatchRejected("No se pudo leer el documento o está vacío")
+        result = await ai.check_document(text, item.reference_text or reference_text, model)
+        line: Dict = {"id": item.id, "ok": True, "result": result}
+    except Exception as exc:
+        logger.warning(f"Fallo la revisión del documento {item.id} del lote: {exc}")
+        line = {"id": item.id, "ok": False, "error": str(exc)}
+    line["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return line
+
+
+async def run_batch(
+    items: Iterable[BatchDocument],
+    reference_text: Optional[str] = None,
+    model: Optional[str] = None,
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[Dict]:
+    """Revisa ``items`` y produce una línea por documento a medida que terminan.
+
+    Termina con una línea ``{"summary": ...}``. Si el consumidor abandona el
+    iterador, las revisiones en curso se cancelan.
+    """
+    ai = AsyncOitAiService(priority=AiPriority.BACKGROUND)
+    limit = max(1, concurrency or settings.ai_batch_concurrency)
+    pending = iter(items)
+    running: set = set()
+    started = time.monotonic()
+    total = failed = 0
+
+    def _fill() -> None:
+        while len(running) < limit:
+            item = next(pending, None)
+            if item is None:
+                return
+            running.add(asyncio.ensure_future(_review(ai, item, reference_text, model)))
+
+    try:
+        _fill()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running.discard(task)
+                line = task.result()
+                total += 1
+                failed += 0 if line["ok"] else 1
+                yield line
+            _fill()
+    finally:
+        for task in running:
+            task.cancel()
+    elapsed = time.monotonic() - started
+    logger.info(f"Lote de revisión IA: {total} documentos, {failed} con error en {elapsed:.1f} s")
+    yield {"summary": {"total": total, "ok": total - failed, "failed": failed, "elapsed_ms": round(elapsed * 1000, 1)}}
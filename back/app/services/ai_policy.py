@@ -0,0 +1,48 @@
+"""Política de revisión IA tras la evaluación de compliance.
+
+El veredicto final sale de compliance cuando éste lo da; la IA sólo suma
+ítems a alertas, faltantes y evidencias. Por eso la revisión IA puede:
+
+- ``sync``: correr dentro del job de ingesta (necesaria si compliance no dio estado),
+- ``async``: correr después como enriquecimiento, sin demorar el resultado,
+- ``skip``: omitirse.
+
+Con ``AI_REVIEW_POLICY=auto`` se elige según el estado de compliance, el
+tamaño del texto enviado al modelo y la cola actual hacia Ollama; cualquier
+otro valor fuerza ese camino.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Optional, Set, Tuple
+
+from ..core.config import settings
+from .ai_scheduler import scheduler
+
+logger = logging.getLogger("oit.ai_policy")
+
+AI_PATHS = ("sync", "async", "skip")
+
+
+def _statuses(value: str) -> Set[str]:
+    return {item.strip().lower() for item in (value or "").split(",") if item.strip()}
+
+
+def choose_ai_path(compliance_status: Optional[str], document_chars: int) -> Tuple[str, str]:
+    """Camino de la revisión IA (``sync``/``async``/``skip``) y el motivo."""
+    mode = (settings.ai_review_policy or "auto").strip().lower()
+    if mode in AI_PATHS:
+        return mode, f"política fija AI_REVIEW_POLICY={mode}"
+    status = (compliance_status or "").lower()
+    if not status:
+        return "sync", "compliance sin veredicto"
+    if status in _statuses(settings.ai_policy_skip_statuses):
+        return "skip", f"compliance '{status}' es concluyente"
+    queue_depth = scheduler.depth()
+    if queue_depth >= settings.ai_policy_max_queue:
+        return "skip", f"cola hacia Ollama saturada ({queue_depth} en espera)"
+    if status in _statuses(settings.ai_policy_async_statuses):
+        return "async", f"compliance '{status}'; IA como enriquecimiento"
+    if document_chars > settings.ai_policy_sync_max_chars:
+        return "async", f"documento extenso ({document_chars} caracteres)"
+    return "sync", f"compliance '{status}'"
@@ -0,0 +1,261 @@
+"""Planificador de llamadas de generación hacia Ollama.
+
+Un servidor Ollama sólo ejecuta unas pocas generaciones a la vez; si todas las
+peticiones llegan juntas, todas esperan en el servidor y vencen por timeout a
+la vez. Aquí se limita la concurrencia (``OLLAMA_MAX_CONCURRENCY``) y las
+llamadas que exceden el límite esperan en una cola con prioridad: chat
+interactivo antes que revisiones de documentos subidos, y éstas antes que
+trabajo de fondo. La cola está acotada (``OLLAMA_QUEUE_MAX``); si está llena,
+una llamada de mayor prioridad desplaza a la espera más reciente de la clase
+más baja, así el trabajo de fondo no deja al chat sin lugar. Si no hay a quién
+desplazar la llamada falla al instante con ``OllamaBusy`` (también la
+desplazada) para que el llamador responda 429 o use su fallback en lugar de
+esperar.
+
+Sirve a hilos (servicio síncrono) y a corrutinas (servicio asíncrono) con el
+mismo cupo. Se registran esperas en cola por clase para ``GET /health``.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger("oit.ai_scheduler")
+
+
+class AiPriority(IntEnum):
+    INTERACTIVE = 0  # chat del usuario
+    REVIEW = 1  # revisión IA de documentos subidos
+    BACKGROUND = 2  # reprocesos y tareas de fondo
+
+
+class OllamaBusy(RuntimeError):
+    """La cola hacia Ollama está llena; reintentar más tarde."""
+
+    def __init__(self, priority: AiPriority, retry_after: int):
+        super().__init__(f"Cola de Ollama llena (prioridad {priority.name.lower()})")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "enqueued", "wake", "granted", "cancelled", "evicted", "retry_after")
+
+    def __init__(self, priority: AiPriority, wake: Callable[[], None]):
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.wake = wake
+        self.granted = False
+        self.cancelled = False
+        # Desplazado de la cola por una llamada de mayor prioridad
+        self.evicted = False
+        self.retry_after = 0
+
+
+class _ClassStats:
+    def __init__(self) -> None:
+        self.admitted = 0
+        self.rejected = 0
+        self.queued = 0  # admitidas tras esperar en cola
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent: Deque[float] = deque(maxlen=256)
+
+    def snapshot(self, waiting: int) -> Dict[str, object]:
+        recent = sorted(self.recent)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queued": self.queued,
+            "waiting": waiting,
+            "avg_wait_ms": round(self.wait_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "p95_wait_ms": round(p95 * 1000, 2),
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+        }
+
+
+class OllamaScheduler:
+    def __init__(self, max_concurrency: int = 2, max_queue: int = 64):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._stats = {priority: _ClassStats() for priority in AiPriority}
+
+    def _enqueue(self, priority: AiPriority, wake: Callable[[], None]) -> Optional[_Waiter]:
+        """Toma un cupo libre (``None``) o encola un ``_Waiter``; con ``_lock``."""
+        if self._active < self.max_concurrency and not self._waiting:
+            self._active += 1
+            self._record(priority, 0.0)
+            return None
+        if self._waiting >= self.max_queue:
+            victim = self._lowest_waiter()
+            if victim is None or victim.priority <= priority:
+                self._stats[priority].rejected += 1
+                logger.warning(
+                    f"Cola de Ollama llena ({self._waiting} en espera); se rechaza llamada {priority.name.lower()}"
+                )
+                raise OllamaBusy(priority, retry_after=self._retry_after())
+            self._evict(victim, priority)
+        waiter = _Waiter(priority, wake)
+        heapq.heappush(self._heap, (int(priority), next(self._seq), waiter))
+        self._waiting += 1
+        return waiter
+
+    def _lowest_waiter(self) -> Optional[_Waiter]:
+        """Espera de menor prioridad y, dentro de la clase, la más reciente; con ``_lock``."""
+        victim = None
+        for key in self._heap:
+            if not key[2].cancelled and (victim is None or key[:2] > victim[:2]):
+                victim = key
+        return victim[2] if victim is not None else None
+
+    def _evict(self, waiter: _Waiter, by: AiPriority) -> None:
+        """Saca ``waiter`` de la cola para dejar lugar a ``by``; lo despierta con ``OllamaBusy``."""
+        waiter.cancelled = True
+        waiter.evicted = True
+        waiter.retry_after = self._retry_after()
+        self._waiting -= 1
+        self._stats[waiter.priority].rejected += 1
+        logger.warning(
+            f"Cola de Ollama llena; una llamada {waiter.priority.name.lower()} cede su lugar a una {by.name.lower()}"
+        )
+        try:
+            waiter.wake()
+        except RuntimeError:
+            # Event loop del waiter ya cerrado: no hay a quién avisar
+            pass
+
+    def _retry_after(self) -> int:
+        # Estimación gruesa: rondas de cola por delante a ~10 s por generación
+        return max(1, round(self._waiting / self.max_concurrency * 10))
+
+    def _record(self, priority: AiPriority, waited: float) -> None:
+        stats = self._stats[priority]
+        stats.admitted += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        stats.recent.append(waited)
+        if waited > 0:
+            stats.queued += 1
+
+    def _cancel(self, waiter: _Waiter) -> bool:
+        """Retira un waiter que dejó de esperar; ``True`` si ya tenía el cupo asignado."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            if not waiter.cancelled:
+                waiter.cancelled = True
+                self._waiting -= 1
+            return False
+
+    def release(self) -> None:
+        """Libera un cupo y lo cede al waiter de mayor prioridad (FIFO dentro de la clase)."""
+        with self._lock:
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.cancelled:
+                    continue
+                waiter.granted = True
+                self._waiting -= 1
+                self._record(waiter.priority, time.monotonic() - waiter.enqueued)
+                break
+            else:
+                self._active -= 1
+                return
+        # El cupo pasa directo al waiter (``_active`` no cambia)
+        try:
+            waiter.wake()
+        except RuntimeError:
+            # Event loop del waiter ya cerrado: el cupo pasa al siguiente
+            self.release()
+
+    def acquire(self, priority: AiPriority) -> None:
+        """Versión bloqueante para hilos; lanza ``OllamaBusy`` si la cola está llena o lo desplazan."""
+        event = threading.Event()
+        with self._lock:
+            waiter = self._enqueue(priority, event.set)
+        if waiter is not None:
+            event.wait()
+            if waiter.evicted:
+                raise OllamaBusy(priority, retry_after=waiter.retry_after)
+
+    async def acquire_async(self, priority: AiPriority) -> None:
+        """Como ``acquire`` pero esperando en el event loop; cancelable."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+
+        def _set() -> None:
+            if not future.done():
+                future.set_result(None)
+
+        with self._lock:
+            waiter = self._enqueue(priority, lambda: loop.call_soon_threadsafe(_set))
+        if waiter is None:
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            if self._cancel(waiter):
+                self.release()
+            raise
+        if waiter.evicted:
+            raise OllamaBusy(priority, retry_after=waiter.retry_after)
+
+    @contextmanager
+    def slot(self, priority: AiPriority) -> Iterator[None]:
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(self, priority: AiPriority) -> AsyncIterator[None]:
+        await self.acquire_async(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def depth(self) -> int:
+        """Llamadas esperando cupo en este momento."""
+        with self._lock:
+            return self._waiting
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            waiting = {priority: 0 for priority in AiPriority}
+            for _, _, waiter in self._heap:
+                if not waiter.cancelled:
+                    waiting[waiter.priority] += 1
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "waiting": self._waiting,
+                "classes": {
+                    priority.name.lower(): self._stats[priority].snapshot(waiting[priority])
+                    for priority in AiPriority
+                },
+            }
+
+
+scheduler = OllamaScheduler(
+    max_concurrency=settings.ollama_max_concurrency,
+    max_queue=settings.ollama_queue_max,
+)
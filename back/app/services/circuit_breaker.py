@@ -0,0 +1,149 @@
+"""Circuit breaker para dependencias remotas (generaciones en Ollama).
+
+Tras ``failure_threshold`` fallos consecutivos el circuito se abre y durante
+``cooldown_s`` las llamadas fallan al instante con ``CircuitOpen`` (el
+llamador usa su fallback) en lugar de esperar el timeout. Vencido el
+enfriamiento pasa a semiabierto: se dejan pasar hasta ``probes`` llamadas de
+prueba; si una responde se cierra, si falla se vuelve a abrir.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger("oit.circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """El circuito está abierto; no se intenta la llamada."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuito {name} abierto; reintento en {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        cooldown_s: float = 30.0,
+        probes: int = 1,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_s = max(0.0, cooldown_s)
+        self.probes = max(1, probes)
+        # Qué excepciones cuentan como fallo del servicio (p. ej. un 404 no)
+        self.is_failure = is_failure or (lambda exc: True)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self.short_circuited = 0
+        self.last_error: Optional[str] = None
+        self._probes_in_flight = 0
+
+    def _retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown_s - time.monotonic())
+
+    def is_open(self) -> bool:
+        """``True`` mientras dura el enfriamiento; sin consumir pruebas.
+
+        Pensado para descartar la llamada antes de prepararla: si devuelve
+        ``True`` se cuenta como cortocircuitada.
+        """
+        with self._lock:
+            if self.state == OPEN and self._retry_in() > 0:
+                self.short_circuited += 1
+                return True
+            return False
+
+    def before_call(self) -> None:
+        """Admite la llamada o lanza ``CircuitOpen``; en semiabierto reserva una prueba."""
+        with self._lock:
+            if self.state == OPEN:
+                if self._retry_in() > 0:
+                    self.short_circuited += 1
+                    raise CircuitOpen(self.name, self._retry_in())
+                self.state = HALF_OPEN
+                self._probes_in_flight = 0
+                logger.info(f"Circuito {self.name} semiabierto: probando recuperación")
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.probes:
+                    self.short_circuited += 1
+                    raise CircuitOpen(self.name, 0.0)
+                self._probes_in_flight += 1
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuito {self.name} cerrado: el servicio respondió")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probes_in_flight = 0
+
+    def on_failure(self, exc: BaseException) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(exc)[:300]
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                    logger.warning(
+                        f"Circuito {self.name} abierto por {self.cooldown_s:.0f} s tras "
+                        f"{self.consecutive_failures} fallos: {self.last_error}"
+                    )
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probes_in_flight = 0
+
+    def on_cancel(self) -> None:
+        """La llamada se abandonó sin veredicto (p. ej. el cliente se desconectó)."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+    def record(self, exc: BaseException) -> None:
+        """Registra una excepción de la llamada según ``is_failure``."""
+        if not isinstance(exc, Exception):
+            self.on_cancel()
+        elif self.is_failure(exc):
+            self.on_failure(exc)
+        else:
+            self.on_success()
+
+    @contextmanager
+    def call(self) -> Iterator[None]:
+        self.before_call()
+        try:
+            yield
+        except BaseException as exc:
+            self.record(exc)
+            raise
+        self.on_success()
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown_s": self.cooldown_s,
+                "retry_in_s": round(self._retry_in(), 1) if self.state == OPEN else 0.0,
+                "trips": self.trips,
+                "short_circuited": self.short_circuited,
+                "last_error": self.last_error,
+            }
@@ -1,8 +1,21 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import re
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from ..core.config import settings
+from .bm25 import PassageIndexer, analyze, collection_idf
+from .keyword_matcher import KeywordMatch, KeywordMatcher, fold_text
+
+logger = logging.getLogger("oit.compliance")
+
+# Incrementar cuando cambie la forma de evaluar los requisitos
+ENGINE_VERSION = 3
 
 COMPLIANCE_DIR = Path(__file__).resolve().parents[1] / "reference_data" / "compliance"
 
@@ -31,13 +44,15 @@ _STOPWORDS = {
 }
 
 
-def _iter_readme_files() -> List[Tuple[str, str]]:
+def _readme_paths() -> List[Path]:
     if not COMPLIANCE_DIR.exists():
         return []
+    return [path for path in sorted(COMPLIANCE_DIR.glob("**/*.md")) if path.is_file()]
+
+
+def _iter_readme_files(paths: Optional[List[Path]] = None) -> List[Tuple[str, str]]:
     docs: List[Tuple[str, str]] = []
-    for path in sorted(COMPLIANCE_DIR.glob("**/*.md")):
-        if not path.is_file():
-            continue
+    for path in _readme_paths() if paths is None else paths:
         try:
             docs.append((path.name, path.read_text(encoding="utf-8", errors="ignore")))
         except Exception:
@@ -73,24 +88,220 @@ def _build_combined_readme(docs: List[Tuple[str, str]]) -> str:
     return "\n\n".join(parts).strip()
 
 
-def evaluate_compliance(document_text: str) -> Dict[str, object]:
-    docs = _iter_readme_files()
-    combined_readme = _build_combined_readme(docs) if docs else ""
+def _engine_id() -> str:
+    return f"engine:{ENGINE_VERSION}:{settings.compliance_pass_score}:{settings.compliance_passage_tokens}"
+
+
+def _requirement_id(requirement: Dict[str, str]) -> str:
+    # Sólo su origen y su texto normalizado: el id no cambia porque se agreguen otros requisitos
+    text = " ".join(fold_text(requirement["text"]).split())
+    digest = hashlib.sha256(f"{requirement['source']}\0{text}".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def _weights_version(weights: Dict[str, float]) -> str:
+    # Los pesos IDF dependen de todo el conjunto de requisitos y entran en cada puntuación
+    digest = hashlib.sha256(",".join(f"{term}:{weights[term]:.6f}" for term in sorted(weights)).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def _docs_version(docs: List[Tuple[str, str]]) -> str:
+    digest = hashlib.sha256()
+    # El motor de evaluación forma parte de la versión: cambiarlo invalida análisis previos
+    digest.update(f"{_engine_id()}\0".encode("utf-8"))
+    for name, content in docs:
+        digest.update(name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """README de compliance ya procesados: requisitos y palabra clave de cada uno."""
+
+    version: str
+    engine: str
+    combined_readme: str
+    requirements: Tuple[Dict[str, str], ...]
+    keywords: Tuple[Optional[str], ...]  # primera palabra clave (plegada) de cada requisito
+    queries: Tuple[Tuple[str, ...], ...]  # términos con stem del requisito para BM25
+    weights: Dict[str, float]  # IDF de cada término entre los requisitos
+    weights_version: str  # cambia si cambian los pesos (p. ej. al agregar o quitar requisitos)
+    matcher: KeywordMatcher  # ubica los términos en el texto para los fragmentos de evidencia
+
+
+_rules_lock = threading.Lock()
+_rules_signature: Optional[Tuple[Tuple[str, int, int], ...]] = None
+_rules: Optional[RuleSet] = None
 
+
+def _signature(paths: List[Path]) -> Tuple[Tuple[str, int, int], ...]:
+    entries = []
+    for path in paths:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((str(path), st.st_mtime_ns, st.st_size))
+    return tuple(entries)
+
+
+def _compile_rules(docs: List[Tuple[str, str]]) -> RuleSet:
     requirements: List[Dict[str, str]] = []
     for name, content in docs:
         requirements.extend(_extract_requirements(content, name))
+    keywords = tuple(fold_text(k) if k else None for k in (_first_keyword(req["text"]) for req in requirements))
+    queries = tuple(tuple(dict.fromkeys(analyze(req["text"]))) for req in requirements)
+    # Un solo autómata con las claves y stems de todos los requisitos (los stems
+    # cortos generarían fragmentos poco útiles)
+    vocabulary = {k for k in keywords if k} | {term for query in queries for term in query if len(term) >= 4}
+    # Un único documento no da un IDF útil; los términos que distinguen un
+    # requisito de los demás pesan más que los comunes a todos
+    weights = collection_idf(queries)
+    for req in requirements:
+        req["id"] = _requirement_id(req)
+    return RuleSet(
+        version=_docs_version(docs),
+        engine=_engine_id(),
+        combined_readme=_build_combined_readme(docs) if docs else "",
+        requirements=tuple(requirements),
+        keywords=keywords,
+        queries=queries,
+        weights=weights,
+        weights_version=_weights_version(weights),
+        matcher=KeywordMatcher(vocabulary),
+    )
 
-    lower_text = (document_text or "").lower()
-    passed: List[Dict[str, str]] = []
-    failed: List[Dict[str, str]] = []
 
-    for req in requirements:
-        keyword = _first_keyword(req["text"])
-        if keyword and keyword in lower_text:
-            passed.append(req)
+def load_rules() -> RuleSet:
+    """Conjunto de reglas compilado; sólo se recompila si cambian los README.
+
+    Cada llamada revisa ruta, mtime y tamaño de los archivos (sin leerlos); si
+    algo cambió se releen y, si el contenido es idéntico, se conserva la versión.
+    """
+    global _rules, _rules_signature
+    paths = _readme_paths()
+    signature = _signature(paths)
+    with _rules_lock:
+        if _rules is not None and signature == _rules_signature:
+            return _rules
+        compiled = _compile_rules(_iter_readme_files(paths))
+        if _rules is None or compiled.version != _rules.version:
+            logger.info(
+                "Reglas compliance compiladas: version=%s, requisitos=%d",
+                compiled.version,
+                len(compiled.requirements),
+            )
+        _rules, _rules_signature = compiled, signature
+        return compiled
+
+
+def rules_version() -> str:
+    """Identificador del conjunto de README de compliance vigente."""
+    return load_rules().version
+
+
+def _as_pages(document: Union[str, Iterable[str], None]) -> Iterable[str]:
+    if document is None:
+        return []
+    if isinstance(document, str):
+        return [document]
+    return document
+
+
+def _index_while_streaming(pages: Iterable[str], indexer: PassageIndexer) -> Iterator[str]:
+    for page in pages:
+        indexer.feed(page)
+        yield page
+
+
+def _best_snippet(
+    query: Tuple[str, ...], keyword: Optional[str], weights: Dict[str, float], matches: Dict[str, KeywordMatch]
+) -> Optional[KeywordMatch]:
+    # Fragmento del término más específico (mayor peso) del requisito que aparezca en el texto
+    candidates = sorted((t for t in query if t in matches), key=lambda t: weights.get(t, 0.0), reverse=True)
+    if candidates:
+        return matches[candidates[0]]
+    return matches.get(keyword) if keyword else None
+
+
+def _evidence_line(item: Dict[str, object]) -> str:
+    line = f"{item['text']} ({item['source']})"
+    if item.get("snippet"):
+        line += f": «{item['snippet']}»"
+    return line
+
+
+def evaluate_compliance(document_text: Union[str, Iterable[str]]) -> Dict[str, object]:
+    """Valida el documento contra los README de compliance.
+
+    ``document_text`` puede ser el texto completo o un iterable de páginas.
+    """
+    rules = load_rules()
+    # Una sola lectura del documento: el autómata ubica los términos y, en el
+    # mismo recorrido, se construye el índice invertido por pasajes
+    indexer = PassageIndexer(
+        settings.compliance_passage_tokens,
+        k1=settings.compliance_bm25_k1,
+        b=settings.compliance_bm25_b,
+    )
+    stream = _index_while_streaming(_as_pages(document_text), indexer)
+    matches: Dict[str, KeywordMatch] = rules.matcher.find_first(stream)
+    for _ in stream:
+        # El autómata se detiene cuando encontró todo; el índice necesita el resto
+        pass
+    index = indexer.close()
+
+    outcomes: List[Dict[str, object]] = []
+    for req, keyword, query in zip(rules.requirements, rules.keywords, rules.queries):
+        if query:
+            _, score = index.best(list(query), rules.weights)
         else:
-            failed.append(req)
+            # Requisito sin términos significativos: basta la palabra clave
+            score = 1.0 if keyword and keyword in matches else 0.0
+        ok = score >= settings.compliance_pass_score
+        match = _best_snippet(query, keyword, rules.weights, matches) if ok else None
+        outcome: Dict[str, object] = {
+            **req,
+            "keyword": keyword,
+            "passed": ok,
+            "score": round(score, 3),
+            "position": match.position if match else None,
+            "snippet": match.snippet if match else None,
+            "matched_terms": [term for term in query if term in index.postings],
+        }
+        outcomes.append(outcome)
+    return _build_report(rules, outcomes)
+
+
+def reevaluate_from_report(previous: Dict[str, object]) -> Optional[Dict[str, object]]:
+    """Recalcula el reporte sin leer el documento, si es posible.
+
+    Sólo aplica cuando el reporte anterior se generó con el mismo motor y los
+    mismos pesos IDF (``weights_version``) y ya contiene el resultado de cada
+    requisito vigente, p. ej. si cambió la redacción fuera de las listas de
+    requisitos o se reordenaron. Agregar, quitar o reescribir un requisito
+    cambia los pesos de todos y obliga a volver a evaluar el texto, que es lo
+    que indica ``None``.
+    """
+    rules = load_rules()
+    if previous.get("engine") != rules.engine or previous.get("weights_version") != rules.weights_version:
+        return None
+    by_id = {
+        item.get("id"): item
+        for item in previous.get("requirements", []) or []
+        if isinstance(item, dict) and item.get("id")
+    }
+    if any(req["id"] not in by_id for req in rules.requirements):
+        return None
+    return _build_report(rules, [{**by_id[req["id"]], **req} for req in rules.requirements])
+
+
+def _build_report(rules: RuleSet, requirements: List[Dict[str, object]]) -> Dict[str, object]:
+    passed = [item for item in requirements if item.get("passed")]
+    failed = [item for item in requirements if not item.get("passed")]
 
     if not requirements:
         status = "check"
@@ -110,7 +321,7 @@ def evaluate_compliance(document_text: str) -> Dict[str, object]:
             status = "error"
             alerts = ["No cumple con las normas README requeridas."]
         missing = [f"{item['text']} ({item['source']})" for item in failed]
-        evidence = [f"{item['text']} ({item['source']})" for item in passed]
+        evidence = [_evidence_line(item) for item in passed]
 
     result = {
         "status": status,
@@ -121,9 +332,12 @@ def evaluate_compliance(document_text: str) -> Dict[str, object]:
     }
 
     report = {
+        "rules_version": rules.version,
+        "engine": rules.engine,
+        "weights_version": rules.weights_version,
         "result": result,
         "requirements": requirements,
-        "readme_combined": combined_readme,
+        "readme_combined": rules.combined_readme,
     }
 
     return report
@@ -0,0 +1,461 @@
+"""Procesamiento en segundo plano de las OIT subidas.
+
+El endpoint de subida sólo guarda el archivo y encola un ``OitJob``; la
+extracción de texto, la validación de compliance y la revisión IA se ejecutan
+aquí, en un pool de hilos, avanzando el documento por los estados
+``queued → extracting → reviewing → done`` (o ``failed``).
+
+Opcionalmente, al subir se calcula un veredicto preliminar con las primeras
+páginas (``partial=True``); el job lo reemplaza con el resultado completo y
+sólo notifica si el veredicto cambió.
+
+La revisión IA sigue la política de ``ai_policy``: dentro del job, como
+enriquecimiento posterior (``ai_path="async_pending"`` hasta completarse) u
+omitida cuando el veredicto de compliance ya es concluyente.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from itertools import islice
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..core.config import BACK_DIR, settings
+from ..database import SessionLocal
+from ..models.oit_document import OitDocument
+from ..models.oit_job import OitJob
+from .ai import OitAiService, iter_extracted_pages
+from .ai_policy import choose_ai_path
+from .ai_scheduler import AiPriority
+from .compliance import evaluate_compliance, rules_version
+from .notifications import create_notification
+from .pdf_extraction import preview_pdf_pages
+from .review_utils import merge_lists
+from .text_cache import ensure_document_text, iter_document_pages
+
+logger = logging.getLogger("oit.ingestion")
+
+UPLOADS_DIR = BACK_DIR / "uploads" / "oit"
+UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+REVIEWS_DIR = UPLOADS_DIR / "reviews"
+REVIEWS_DIR.mkdir(parents=True, exist_ok=True)
+# Un bundle README por versión de reglas, compartido por todos los documentos
+BUNDLES_DIR = REVIEWS_DIR / "bundles"
+BUNDLES_DIR.mkdir(parents=True, exist_ok=True)
+
+ACTIVE_STATES = ("queued", "extracting", "reviewing")
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, settings.ingestion_workers),
+    thread_name_prefix="oit-ingest",
+)
+# Enriquecimiento IA aparte: no ocupa hilos de ingesta mientras espera cupo en Ollama
+_enrich_executor = ThreadPoolExecutor(
+    max_workers=max(1, settings.ollama_max_concurrency),
+    thread_name_prefix="oit-ai-enrich",
+)
+
+
+def artifact_stem(doc: OitDocument) -> str:
+    """Prefijo de los archivos derivados (reportes, muestreo, análisis) del documento.
+
+    Los documentos con contenido deduplicado comparten ``filename``, así que sus
+    derivados se nombran por id; los antiguos conservan el nombre del archivo.
+    """
+    if doc.content_hash:
+        return f"oit_{doc.id}"
+    return Path(doc.filename).stem
+
+
+def bundle_path_for(doc: OitDocument) -> Path:
+    """Ruta del bundle por documento usada antes de compartirlo por versión."""
+    return REVIEWS_DIR / f"{artifact_stem(doc)}_bundle.md"
+
+
+def bundle_path_for_version(version: str) -> Path:
+    return BUNDLES_DIR / f"readme_compliance_{version}.md"
+
+
+def report_path_for(doc: OitDocument) -> Path:
+    return REVIEWS_DIR / f"{artifact_stem(doc)}_report.json"
+
+
+def create_ingest_job(db: Session, doc: OitDocument) -> OitJob:
+    """Registra un job ``queued`` para el documento (sin enviarlo al pool)."""
+    job = OitJob(id=uuid.uuid4().hex, document_id=doc.id, kind="ingest", status="queued")
+    doc.processing_status = "queued"
+    db.add(job)
+    db.add(doc)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def submit_job(job_id: str, priority: AiPriority = AiPriority.REVIEW) -> None:
+    _executor.submit(run_ingest_job, job_id, priority)
+
+
+def submit_enrichment(doc_id: int) -> None:
+    _enrich_executor.submit(run_ai_enrichment, doc_id)
+
+
+def resume_pending_jobs() -> int:
+    """Reencola los jobs que quedaron activos tras un reinicio del proceso."""
+    db = SessionLocal()
+    try:
+        pending = db.query(OitJob).filter(OitJob.status.in_(ACTIVE_STATES)).all()
+        for job in pending:
+            if job.status != "queued":
+                job.status = "queued"
+                job.started_at = None
+                db.add(job)
+        db.commit()
+        ids = [job.id for job in pending]
+        enrich_ids = [
+            doc_id
+            for (doc_id,) in db.query(OitDocument.id).filter(
+                OitDocument.ai_path == "async_pending",
+                OitDocument.processing_status == "done",
+            )
+        ]
+    finally:
+        db.close()
+    for job_id in ids:
+        # Reprocesos tras reinicio: detrás de las revisiones de subidas nuevas en la cola de Ollama
+        submit_job(job_id, AiPriority.BACKGROUND)
+    for doc_id in enrich_ids:
+        submit_enrichment(doc_id)
+    if ids:
+        logger.info("Reencolados %d jobs de ingesta pendientes", len(ids))
+    if enrich_ids:
+        logger.info("Reencolados %d enriquecimientos IA pendientes", len(enrich_ids))
+    return len(ids)
+
+
+def _preview_pages(path: Path) -> Optional[List[str]]:
+    """Primeras páginas del archivo dentro del presupuesto preliminar; ``None`` si vence el plazo."""
+    if path.suffix.lower() == ".pdf":
+        # Un solo rango en el pool con plazo total: una página problemática no cuelga la subida
+        head = preview_pdf_pages(path, settings.preliminary_max_pages, settings.preliminary_timeout_s)
+        if head is None:
+            return None
+    else:
+        head = islice(iter_extracted_pages(path), settings.preliminary_max_pages)
+    pages: List[str] = []
+    budget = settings.preliminary_max_chars
+    for page in head:
+        if budget > 0:
+            page = page[:budget]
+            budget -= len(page)
+        pages.append(page)
+        if settings.preliminary_max_chars > 0 and budget <= 0:
+            break
+    return pages
+
+
+def apply_preliminary_verdict(doc: OitDocument) -> bool:
+    """Evalúa compliance sólo con las primeras páginas y marca el documento ``partial``.
+
+    Devuelve ``False`` (sin tocar el documento) si está desactivado o no hubo texto.
+    """
+    if settings.preliminary_max_pages <= 0:
+        return False
+    try:
+        pages = _preview_pages(BACK_DIR / doc.filename)
+        if pages is None:
+            logger.warning(f"Veredicto preliminar omitido para OIT id={doc.id}: la extracción excedió el plazo")
+            return False
+        if not any(page.strip() for page in pages):
+            return False
+        result = evaluate_compliance(pages).get("result", {})
+    except Exception as exc:
+        logger.warning(f"No se pudo calcular el veredicto preliminar de OIT id={doc.id}: {exc}")
+        return False
+    doc.status = result.get("status") or doc.status
+    doc.summary = f"Resultado preliminar ({len(pages)} páginas): {result.get('summary') or ''}".strip()
+    doc.alerts = json.dumps(result.get("alerts", []), ensure_ascii=False)
+    doc.missing = json.dumps(result.get("missing", []), ensure_ascii=False)
+    doc.evidence = json.dumps(result.get("evidence", []), ensure_ascii=False)
+    doc.partial = True
+    logger.info(f"Veredicto preliminar OIT id={doc.id}: status={doc.status} ({len(pages)} páginas)")
+    return True
+
+
+def _claim(db: Session, job_id: str) -> bool:
+    # Actualización condicional: si otro worker ya tomó el job, no hace nada
+    claimed = (
+        db.query(OitJob)
+        .filter(OitJob.id == job_id, OitJob.status == "queued")
+        .update({OitJob.status: "extracting", OitJob.started_at: datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(claimed)
+
+
+def _set_stage(db: Session, job: OitJob, doc: OitDocument, stage: str) -> None:
+    job.status = stage
+    doc.processing_status = stage
+    if stage in ("done", "failed"):
+        job.finished_at = datetime.utcnow()
+    db.add(job)
+    db.add(doc)
+    db.commit()
+
+
+def _ensure_bundle(version: str, content: str) -> Path:
+    path = bundle_path_for_version(version)
+    if not path.exists():
+        tmp = path.with_name(f".{uuid.uuid4().hex}.part")
+        tmp.write_text(content, encoding="utf-8")
+        os.replace(tmp, path)
+    return path
+
+
+def write_compliance_files(doc: OitDocument, compliance: Dict[str, object]) -> None:
+    """Enlaza el bundle de la versión de reglas y escribe el reporte del documento.
+
+    El reporte sólo guarda el resultado y los requisitos evaluados; el README
+    combinado vive una sola vez por versión en ``BUNDLES_DIR``.
+    """
+    version = str(compliance.get("rules_version") or "")
+    if version:
+        try:
+            bundle_path = _ensure_bundle(version, str(compliance.get("readme_combined", "")))
+            doc.compliance_bundle_path = str(bundle_path.relative_to(BACK_DIR))
+        except Exception as exc:
+            logger.warning(f"No se pudo escribir bundle README: {exc}")
+    report_path = report_path_for(doc)
+    report = {key: value for key, value in compliance.items() if key != "readme_combined"}
+    try:
+        report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        doc.compliance_report_path = str(report_path.relative_to(BACK_DIR))
+    except Exception as exc:
+        logger.warning(f"No se pudo escribir reporte compliance: {exc}")
+
+
+def notify_result(
+    db: Session,
+    doc: OitDocument,
+    alerts: List[str],
+    missing: List[str],
+    previous_status: Optional[str] = None,
+) -> None:
+    if not doc.created_by_id:
+        return
+    # Si el usuario ya vio un estado (preliminar o de una evaluación anterior) sólo avisar si cambió
+    if previous_status is not None and previous_status == doc.status:
+        return
+    notification_type = "oit.approved" if doc.status == "check" else "oit.review_required"
+    notification_title = "OIT lista" if doc.status == "check" else "OIT requiere revisión"
+    notification_message = (
+        f"La OIT #{doc.id} fue aprobada sin alertas." if doc.status == "check" else doc.summary or "La IA detectó observaciones."
+    )
+    create_notification(
+        db,
+        user_id=doc.created_by_id,
+        type=notification_type,
+        title=notification_title,
+        message=notification_message,
+        document_id=doc.id,
+        payload={
+            "status": doc.status,
+            "previous_status": previous_status,
+            "alerts": alerts,
+            "missing": missing,
+        },
+    )
+
+
+def _notify_failure(db: Session, doc: OitDocument, error: str) -> None:
+    if not doc.created_by_id:
+        return
+    create_notification(
+        db,
+        user_id=doc.created_by_id,
+        type="oit.processing_failed",
+        title="No se pudo procesar la OIT",
+        message=f"La OIT #{doc.id} no pudo procesarse: {error}",
+        document_id=doc.id,
+        payload={"error": error},
+    )
+
+
+def _find_reusable_analysis(db: Session, doc: OitDocument, version: str, model: str) -> Optional[OitDocument]:
+    """Documento ya analizado con el mismo contenido, versión de reglas y modelo."""
+    if not doc.content_hash:
+        return None
+    return (
+        db.query(OitDocument)
+        .filter(
+            OitDocument.content_hash == doc.content_hash,
+            OitDocument.rules_version == version,
+            OitDocument.ai_model == model,
+            OitDocument.processing_status == "done",
+            OitDocument.id != doc.id,
+        )
+        .order_by(OitDocument.created_at.desc())
+        .first()
+    )
+
+
+def _copy_analysis(source: OitDocument, doc: OitDocument) -> None:
+    doc.status = source.status
+    doc.summary = source.summary
+    doc.alerts = source.alerts
+    doc.missing = source.missing
+    doc.evidence = source.evidence
+    doc.review_notes = source.review_notes
+    doc.ai_path = source.ai_path
+    doc.compliance_bundle_path = source.compliance_bundle_path
+    doc.compliance_report_path = source.compliance_report_path
+
+
+def run_ingest_job(job_id: str, priority: AiPriority = AiPriority.REVIEW) -> None:
+    """Ejecuta extracción, compliance e IA para el documento del job."""
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id):
+            return
+        job = db.get(OitJob, job_id)
+        doc: Optional[OitDocument] = db.get(OitDocument, job.document_id) if job else None
+        if job is None or doc is None:
+            return
+        # Estado mostrado al subir (veredicto preliminar), para notificar sólo si cambia
+        preliminary_status = doc.status if doc.partial else None
+        try:
+            doc.processing_status = "extracting"
+            db.add(doc)
+            db.commit()
+
+            ai = OitAiService(priority=priority)
+            version = rules_version()
+            doc.rules_version = version
+            doc.ai_model = ai.model
+
+            # Contenido idéntico ya analizado con las mismas reglas y modelo: reutilizar
+            source = _find_reusable_analysis(db, doc, version, ai.model)
+            if source is not None:
+                _copy_analysis(source, doc)
+                doc.partial = False
+                logger.info(f"OIT id={doc.id} reutiliza el análisis de OIT id={source.id} (sha256={doc.content_hash})")
+                _set_stage(db, job, doc, "done")
+                notify_result(
+                    db, doc, json.loads(doc.alerts or "[]"), json.loads(doc.missing or "[]"), preliminary_status
+                )
+                if doc.ai_path == "async_pending":
+                    # El original aún no terminó su enriquecimiento: éste hace el suyo
+                    submit_enrichment(doc.id)
+                return
+
+            # Extrae página a página directo a la caché de texto que leen los demás endpoints
+            if not ensure_document_text(doc):
+                raise ValueError("No se pudo leer el documento o está vacío")
+            logger.info(f"Extraído texto OIT id={doc.id}")
+
+            # Evaluación por README corporativos (consumiendo las páginas en streaming)
+            compliance = evaluate_compliance(iter_document_pages(doc))
+            compliance_result = compliance.get("result", {})
+            comp_status = compliance_result.get("status")
+            comp_alerts = compliance_result.get("alerts", [])
+            comp_missing = compliance_result.get("missing", [])
+            logger.info(
+                "Resultado compliance README: status=%s, alerts=%d, missing=%d",
+                comp_status,
+                len(comp_alerts),
+                len(comp_missing),
+            )
+
+            _set_stage(db, job, doc, "reviewing")
+
+            # Analizar con IA (Ollama / fallback) como complemento informativo, según la política
+            doc_chars = sum(len(page) for page in iter_document_pages(doc))
+            ai_path, reason = choose_ai_path(comp_status, doc_chars)
+            logger.info(f"Revisión IA OIT id={doc.id}: {ai_path} ({reason})")
+            if ai_path == "sync":
+                ai_result = ai.check_pages(lambda: iter_document_pages(doc))
+            else:
+                ai_result = {}
+            doc.ai_path = "async_pending" if ai_path == "async" else ai_path
+
+            alerts = merge_lists(comp_alerts, ai_result.get("alerts"))
+            missing = merge_lists(comp_missing, ai_result.get("missing"))
+            evidence = merge_lists(compliance_result.get("evidence", []), ai_result.get("evidence"))
+
+            doc.status = comp_status or ai_result.get("status", "error")
+            doc.summary = compliance_result.get("summary") or ai_result.get("summary")
+            doc.alerts = json.dumps(alerts, ensure_ascii=False)
+            doc.missing = json.dumps(missing, ensure_ascii=False)
+            doc.evidence = json.dumps(evidence, ensure_ascii=False)
+            doc.review_notes = ai_result.get("notes") or ai_result.get("summary") or ""
+            doc.partial = False
+            write_compliance_files(doc, compliance)
+            logger.info(
+                "Resultado final OIT id=%s: status=%s, alerts=%d, missing=%d, evidence=%d",
+                doc.id,
+                doc.status,
+                len(alerts),
+                len(missing),
+                len(evidence),
+            )
+
+            _set_stage(db, job, doc, "done")
+            notify_result(db, doc, alerts, missing, preliminary_status)
+            if doc.ai_path == "async_pending":
+                submit_enrichment(doc.id)
+        except Exception as exc:
+            logger.exception(f"Fallo procesando job de ingesta {job_id}")
+            db.rollback()
+            job.error = str(exc)
+            doc.status = "error"
+            doc.partial = False
+            doc.summary = str(exc) if preliminary_status is not None else doc.summary or str(exc)
+            _set_stage(db, job, doc, "failed")
+            try:
+                _notify_failure(db, doc, str(exc))
+            except Exception:
+                pass
+    finally:
+        db.close()
+
+
+def run_ai_enrichment(doc_id: int) -> None:
+    """Revisión IA posterior al job: suma sus ítems al resultado ya publicado.
+
+    El estado del documento lo fijó compliance y no cambia; sólo se agregan
+    alertas, faltantes y evidencias del modelo y sus notas.
+    """
+    db = SessionLocal()
+    try:
+        doc = db.get(OitDocument, doc_id)
+        if doc is None or doc.ai_path != "async_pending":
+            return
+        try:
+            ai = OitAiService(priority=AiPriority.BACKGROUND)
+            ai_result = ai.check_pages(lambda: iter_document_pages(doc))
+        except Exception:
+            # Queda pendiente; se reintenta al reiniciar
+            logger.exception(f"Fallo el enriquecimiento IA de OIT id={doc_id}")
+            return
+        # El documento pudo cambiar mientras esperaba a Ollama
+        db.refresh(doc)
+        if doc.ai_path != "async_pending":
+            return
+        doc.alerts = json.dumps(merge_lists(json.loads(doc.alerts or "[]"), ai_result.get("alerts")), ensure_ascii=False)
+        doc.missing = json.dumps(merge_lists(json.loads(doc.missing or "[]"), ai_result.get("missing")), ensure_ascii=False)
+        doc.evidence = json.dumps(
+            merge_lists(json.loads(doc.evidence or "[]"), ai_result.get("evidence")), ensure_ascii=False
+        )
+        doc.review_notes = ai_result.get("notes") or ai_result.get("summary") or ""
+        doc.ai_path = "async"
+        db.add(doc)
+        db.commit()
+        logger.info(f"Enriquecimiento IA completado para OIT id={doc_id}")
+    finally:
+        db.close()
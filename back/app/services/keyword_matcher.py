@@ -0,0 +1,128 @@
+"""Búsqueda simultánea de palabras clave (Aho-Corasick) sobre texto plegado.
+
+Todas las claves se compilan en un único autómata y el documento se recorre
+una sola vez, página a página, con independencia del número de claves. El
+texto se pliega (minúsculas y sin tildes) carácter a carácter, de modo que las
+posiciones encontradas corresponden al texto original y sirven para extraer
+fragmentos de evidencia.
+"""
+from __future__ import annotations
+
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+
+def _build_fold_table() -> Dict[int, str]:
+    table: Dict[int, str] = {}
+    for code in range(0x250):  # Latin-1 + Latin Extended A/B
+        char = chr(code)
+        base = "".join(c for c in unicodedata.normalize("NFD", char) if not unicodedata.combining(c)).lower()
+        # Sólo reemplazos 1 a 1 para conservar las posiciones
+        if len(base) == 1 and base != char:
+            table[code] = base
+    return table
+
+
+_FOLD_TABLE = _build_fold_table()
+
+
+def fold_text(text: str) -> str:
+    """Minúsculas y sin tildes, conservando la longitud del texto."""
+    return text.translate(_FOLD_TABLE)
+
+
+@dataclass(frozen=True)
+class KeywordMatch:
+    keyword: str
+    position: int  # desplazamiento en las páginas unidas con "\n"
+    snippet: str
+
+
+class KeywordMatcher:
+    """Autómata Aho-Corasick (como DFA completo) sobre claves plegadas."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = sorted({fold_text(k).strip() for k in keywords if k and k.strip()})
+        self._delta: List[Dict[str, int]] = [{}]
+        self._output: List[List[int]] = [[]]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                nxt = self._delta[state].get(char)
+                if nxt is None:
+                    nxt = len(self._delta)
+                    self._delta.append({})
+                    self._output.append([])
+                    self._delta[state][char] = nxt
+                state = nxt
+            self._output[state].append(index)
+        self._build_links()
+
+    def _build_links(self) -> None:
+        # BFS: cada estado hereda las transiciones y salidas de su enlace de fallo,
+        # así el recorrido es una sola búsqueda en diccionario por carácter
+        fail = [0] * len(self._delta)
+        queue = list(self._delta[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, nxt in list(self._delta[state].items()):
+                queue.append(nxt)
+                link = fail[state]
+                while link and char not in self._delta[link]:
+                    link = fail[link]
+                target = self._delta[link].get(char, 0)
+                fail[nxt] = target if target != nxt else 0
+                self._output[nxt] = self._output[nxt] + self._output[fail[nxt]]
+            fallback = self._delta[fail[state]]
+            for char, target in fallback.items():
+                self._delta[state].setdefault(char, target)
+
+    def find_first(self, pages: Iterable[str], context: int = 60) -> Dict[str, KeywordMatch]:
+        """Primera aparición de cada clave en ``pages`` (una sola pasada).
+
+        Deja de consumir páginas en cuanto todas las claves aparecieron.
+        """
+        found: Dict[str, KeywordMatch] = {}
+        if not self.keywords:
+            return found
+        delta = self._delta
+        output = self._output
+        state = 0
+        offset = 0
+        first_page = True
+        for page in pages:
+            if len(found) == len(self.keywords):
+                break
+            if not first_page:
+                # Separador entre páginas, como en el texto unido con "\n"
+                state = delta[state].get("\n", 0)
+                offset += 1
+            first_page = False
+            folded = fold_text(page)
+            for index, char in enumerate(folded):
+                state = delta[state].get(char, 0)
+                if output[state]:
+                    for keyword_index in output[state]:
+                        keyword = self.keywords[keyword_index]
+                        if keyword in found:
+                            continue
+                        start = index - len(keyword) + 1
+                        found[keyword] = KeywordMatch(
+                            keyword=keyword,
+                            position=offset + start,
+                            snippet=_snippet(page, max(start, 0), index + 1, context),
+                        )
+            offset += len(page)
+        return found
+
+
+def _snippet(page: str, start: int, end: int, context: int) -> str:
+    left = max(0, start - context)
+    right = min(len(page), end + context)
+    text = " ".join(page[left:right].split())
+    prefix = "…" if left > 0 else ""
+    suffix = "…" if right < len(page) else ""
+    return f"{prefix}{text}{suffix}"
@@ -0,0 +1,166 @@
+"""Caché de respuestas de Ollama para llamadas deterministas.
+
+Una generación con ``temperature`` 0 y sin streaming siempre produce la misma
+respuesta para el mismo (servidor, modelo, prompt, opciones), así que se
+guarda bajo el SHA-256 de esos datos. Hay dos niveles: un LRU en memoria y
+archivos ``uploads/ai_cache/<xx>/<clave>.json.gz`` en disco, acotados por
+``LLM_CACHE_MAX_BYTES`` (se descartan primero los usados hace más tiempo).
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..core.config import BACK_DIR, settings
+
+logger = logging.getLogger("oit.llm_cache")
+
+LLM_CACHE_DIR = BACK_DIR / "uploads" / "ai_cache"
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, Dict]" = OrderedDict()
+_disk_bytes: Optional[int] = None
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def cache_key(url: str, payload: Dict) -> Optional[str]:
+    """Clave de la llamada, o ``None`` si no es determinista (no se cachea)."""
+    options = payload.get("options") or {}
+    if payload.get("stream") or float(options.get("temperature", 1.0)) != 0.0:
+        return None
+    material = json.dumps({"url": url, "payload": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _path(key: str) -> Path:
+    return LLM_CACHE_DIR / key[:2] / f"{key}.json.gz"
+
+
+def _remember(key: str, data: Dict) -> None:
+    _memory[key] = data
+    _memory.move_to_end(key)
+    while len(_memory) > max(settings.llm_cache_memory_entries, 0):
+        _memory.popitem(last=False)
+
+
+def _scan_disk() -> List[Tuple[float, int, Path]]:
+    entries: List[Tuple[float, int, Path]] = []
+    if not LLM_CACHE_DIR.exists():
+        return entries
+    for path in LLM_CACHE_DIR.glob("*/*.json.gz"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+
+def _disk_usage() -> int:
+    global _disk_bytes
+    if _disk_bytes is None:
+        _disk_bytes = sum(size for _, size, _ in _scan_disk())
+    return _disk_bytes
+
+
+def _evict_disk() -> None:
+    """Borra las entradas menos usadas hasta quedar en el 90% del límite (con ``_lock``)."""
+    global _disk_bytes
+    limit = settings.llm_cache_max_bytes
+    if limit <= 0 or _disk_usage() <= limit:
+        return
+    target = int(limit * 0.9)
+    for _, size, path in sorted(_scan_disk()):
+        if _disk_bytes <= target:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        _disk_bytes -= size
+        _stats["evictions"] += 1
+
+
+def get(key: str) -> Optional[Dict]:
+    with _lock:
+        data = _memory.get(key)
+        if data is not None:
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return data
+    path = _path(key)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            data = json.load(fh)
+        # El mtime marca el último uso para la expulsión LRU en disco
+        os.utime(path)
+    except FileNotFoundError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    except Exception as exc:
+        logger.warning(f"Entrada de caché IA ilegible {path.name}: {exc}")
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    with _lock:
+        _stats["disk_hits"] += 1
+        _remember(key, data)
+    return data
+
+
+def put(key: str, data: Dict) -> None:
+    global _disk_bytes
+    path = _path(key)
+    tmp = path.with_name(f".{uuid.uuid4().hex}.part")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False)
+        size = tmp.stat().st_size
+        previous = path.stat().st_size if path.exists() else 0
+        os.replace(tmp, path)
+    except Exception as exc:
+        logger.warning(f"No se pudo guardar respuesta IA en caché: {exc}")
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return
+    with _lock:
+        _remember(key, data)
+        _stats["stores"] += 1
+        if _disk_bytes is not None:
+            _disk_bytes += size - previous
+        _evict_disk()
+
+
+def purge() -> Dict[str, int]:
+    """Vacía ambos niveles; devuelve cuántas entradas se borraron."""
+    global _disk_bytes
+    with _lock:
+        memory_entries = len(_memory)
+        _memory.clear()
+        removed = 0
+        for _, _, path in _scan_disk():
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                continue
+        _disk_bytes = None
+    logger.info(f"Caché IA purgada: {memory_entries} en memoria, {removed} en disco")
+    return {"memory_entries": memory_entries, "disk_entries": removed}
+
+
+def cache_stats() -> Dict[str, int]:
+    with _lock:
+        return {**_stats, "memory_entries": len(_memory), "disk_bytes": _disk_usage()}
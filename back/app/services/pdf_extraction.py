@@ -0,0 +1,241 @@
+"""Extracción de texto de PDF por páginas en un pool de procesos.
+
+Los PDF grandes se dividen en rangos de páginas que se reparten entre
+procesos (pypdf es CPU-bound y no libera el GIL). Cada página tiene un
+tiempo máximo: dentro del worker se corta con ``SIGALRM`` cuando el sistema
+lo soporta, y el proceso padre además impone un plazo por rango. ``SIGALRM``
+sólo funciona en el hilo principal, así que la extracción serial pedida desde
+otro hilo (jobs de ingesta, requests) también pasa por el pool, en rangos
+sucesivos, para no quedar sin plazo. Si un rango
+vence, sus páginas quedan vacías y el pool se recicla para no dejar procesos
+colgados. Los rangos de otros documentos que estaban en ese pool se
+reintentan en el nuevo. Un rango que vence o falla marca la extracción como
+incompleta (``ExtractionStatus``) para que no se guarde en la caché de texto.
+El resultado siempre respeta el orden de las páginas.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from ..core.config import settings
+
+# Import condicional de pypdf
+try:
+    from pypdf import PdfReader  # type: ignore
+except Exception:
+    PdfReader = None  # type: ignore
+
+logger = logging.getLogger("oit.pdf")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+class PageTimeout(Exception):
+    pass
+
+
+@dataclass
+class ExtractionStatus:
+    """Lo completa el extractor: ``complete`` pasa a ``False`` si se perdió algún rango."""
+
+    complete: bool = True
+
+
+def _alarm_handler(signum, frame):  # pragma: no cover - se ejecuta en el worker
+    raise PageTimeout()
+
+
+def _can_alarm() -> bool:
+    return hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+
+
+def _extract_page(page, timeout: float) -> str:
+    use_alarm = timeout > 0 and _can_alarm()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _alarm_handler)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return page.extract_text() or ""
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_one(reader, index: int, timeout: float, name: str) -> str:
+    try:
+        return _extract_page(reader.pages[index], timeout)
+    except PageTimeout:
+        logger.warning(f"Página {index + 1} de {name} excedió {timeout}s; se omite")
+    except Exception as exc:
+        logger.warning(f"No se pudo extraer la página {index + 1} de {name}: {exc}")
+    return ""
+
+
+def _extract_range(path: str, start: int, end: int, timeout: float) -> List[str]:
+    """Extrae las páginas ``[start, end)`` (acotado al total); se ejecuta dentro de un worker."""
+    reader = PdfReader(path)
+    name = Path(path).name
+    end = min(end, len(reader.pages))
+    return [_extract_one(reader, index, timeout, name) for index in range(start, end)]
+
+
+def _worker_count() -> int:
+    return settings.pdf_extract_workers or os.cpu_count() or 1
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el proceso del API tiene hilos y fork podría heredar locks tomados
+            _pool = ProcessPoolExecutor(
+                max_workers=_worker_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    """Descarta el pool actual terminando sus procesos (p. ej. tras un timeout)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        try:
+            process.terminate()
+        except Exception:
+            pass
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_ranges(total: int, workers: int) -> List[Tuple[int, int]]:
+    # Rangos más pequeños que páginas/worker para balancear páginas costosas
+    size = max(1, math.ceil(total / (workers * 4)))
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def page_count(path: Path) -> int:
+    if PdfReader is None:
+        return 0
+    return len(PdfReader(str(path)).pages)
+
+
+def iter_pdf_pages(
+    path: Path, parallel: Optional[bool] = None, status: Optional[ExtractionStatus] = None
+) -> Iterator[str]:
+    """Genera el texto de cada página del PDF, en orden, sin acumular el documento.
+
+    Usa el pool de procesos cuando el documento tiene al menos
+    ``PDF_PARALLEL_MIN_PAGES`` páginas y hay más de un worker; en ese caso se
+    emite cada rango apenas termina (respetando el orden). La extracción
+    serial se hace en este proceso sólo si aquí hay ``SIGALRM``; si no, se
+    envía al pool en rangos sucesivos. Si un rango vence o falla se emite vacío y
+    ``status.complete`` queda en ``False``.
+    """
+    total = page_count(path)
+    workers = _worker_count()
+    timeout = settings.pdf_page_timeout_s
+    if parallel is None:
+        parallel = workers > 1 and total >= settings.pdf_parallel_min_pages
+    if total == 0:
+        return
+    if not parallel:
+        if timeout <= 0 or _can_alarm():
+            reader = PdfReader(str(path))
+            for index in range(total):
+                yield _extract_one(reader, index, timeout, path.name)
+            return
+        # Sin SIGALRM en este hilo: el worker corta cada página y aquí se vigila el plazo del rango
+        yield from _iter_ranges(path, _page_ranges(total, 1), 1, timeout, status)
+        return
+    # Ventana acotada de rangos en vuelo para no retener resultados de todo el documento
+    yield from _iter_ranges(path, _page_ranges(total, workers), workers * 2, timeout, status)
+
+
+def _iter_ranges(
+    path: Path, ranges: List[Tuple[int, int]], window: int, timeout: float, status: Optional[ExtractionStatus]
+) -> Iterator[str]:
+    """Extrae ``ranges`` en el pool con hasta ``window`` rangos en vuelo y emite sus páginas en orden."""
+    pool = _get_pool()
+    futures = [pool.submit(_extract_range, str(path), start, end, timeout) for start, end in ranges[:window]]
+    broken = False
+    try:
+        for position, (start, end) in enumerate(ranges):
+            future = futures[position]
+            next_position = position + window
+            if next_position < len(ranges):
+                n_start, n_end = ranges[next_position]
+                futures.append(pool.submit(_extract_range, str(path), n_start, n_end, timeout))
+            # Plazo del rango: timeout por página más holgura por arranque del worker
+            deadline = timeout * (end - start) + 30 if timeout > 0 else None
+            try:
+                try:
+                    texts = future.result(timeout=deadline)
+                except BrokenProcessPool:
+                    # Otro documento recicló el pool con este rango en vuelo: reintentar en el nuevo
+                    logger.info(f"Reintentando páginas {start + 1}-{end} de {path.name} en un pool nuevo")
+                    texts = _get_pool().submit(_extract_range, str(path), start, end, timeout).result(timeout=deadline)
+            except FutureTimeout:
+                logger.warning(f"Rango de páginas {start + 1}-{end} de {path.name} excedió el plazo; se omite")
+                texts = [""] * (end - start)
+                broken = True
+                if status is not None:
+                    status.complete = False
+            except Exception as exc:
+                logger.warning(f"Fallo extrayendo páginas {start + 1}-{end} de {path.name}: {exc}")
+                texts = [""] * (end - start)
+                if status is not None:
+                    status.complete = False
+            futures[position] = None  # liberar el resultado ya emitido
+            yield from texts
+    finally:
+        for pending in futures:
+            if pending is not None:
+                pending.cancel()
+        if broken:
+            _reset_pool()
+
+
+def preview_pdf_pages(path: Path, max_pages: int, deadline: float) -> Optional[List[str]]:
+    """Primeras ``max_pages`` páginas extraídas en el pool con un plazo total.
+
+    Para extracciones dentro de una request (veredicto preliminar): ``None``
+    si el plazo vence (el pool se recicla) o la extracción falla.
+    """
+    future = _get_pool().submit(_extract_range, str(path), 0, max_pages, settings.pdf_page_timeout_s)
+    try:
+        return future.result(timeout=deadline if deadline > 0 else None)
+    except FutureTimeout:
+        logger.warning(f"Las primeras {max_pages} páginas de {path.name} excedieron {deadline}s; se omiten")
+        future.cancel()
+        _reset_pool()
+    except Exception as exc:
+        logger.warning(f"No se pudieron extraer las primeras páginas de {path.name}: {exc}")
+    return None
+
+
+def extract_pdf_pages(path: Path, parallel: Optional[bool] = None) -> List[str]:
+    """Texto de cada página del PDF, en orden (ver ``iter_pdf_pages``)."""
+    return list(iter_pdf_pages(path, parallel=parallel))
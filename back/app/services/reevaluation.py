@@ -0,0 +1,286 @@
+"""Reevaluación masiva de OIT cuando cambian las reglas de compliance.
+
+Busca los documentos cuya ``rules_version`` no coincide con la vigente y los
+vuelve a evaluar contra el texto ya extraído (caché de texto), en un pool de
+procesos. Los cambios se escriben por lotes, cada uno en su propia
+transacción; los reportes en disco y las notificaciones se emiten recién
+cuando el lote se confirmó. Como cada documento actualizado queda con la
+versión vigente, volver a ejecutar el proceso continúa donde quedó.
+
+Si el reporte anterior ya tiene el resultado de todos los requisitos vigentes
+con el mismo motor y los mismos pesos IDF (cambios en los README fuera de las
+listas de requisitos), el veredicto se recalcula sin leer el documento; si el
+conjunto de requisitos cambió, se vuelve a leer el texto.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..core.config import BACK_DIR, settings
+from ..database import SessionLocal
+from ..models.oit_document import OitDocument
+from .compliance import evaluate_compliance, reevaluate_from_report, rules_version
+from .ingestion import (
+    bundle_path_for_version,
+    notify_result,
+    report_path_for,
+    write_compliance_files,
+)
+from .review_utils import merge_lists
+
+logger = logging.getLogger("oit.reevaluation")
+
+
+@dataclass
+class ReevaluationProgress:
+    rules_version: str
+    total: int = 0
+    processed: int = 0
+    changed: int = 0  # documentos cuyo estado cambió
+    reused: int = 0  # recalculados desde el reporte anterior, sin leer el texto
+    failed: int = 0
+    running: bool = False
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+_run_lock = threading.Lock()
+_progress: Optional[ReevaluationProgress] = None
+
+
+def _init_worker() -> None:  # pragma: no cover - se ejecuta en el worker
+    # Dentro del worker la extracción de PDF (si falta en caché) es serial
+    settings.pdf_extract_workers = 1
+
+
+def _evaluate_file(path: str, content_hash: Optional[str]) -> Dict[str, object]:
+    """Evalúa un archivo contra las reglas vigentes; se ejecuta dentro de un worker."""
+    from .text_cache import iter_pages
+
+    return evaluate_compliance(iter_pages(Path(path), content_hash))
+
+
+def _stale_query(db: Session, version: str):
+    return db.query(OitDocument).filter(
+        OitDocument.processing_status == "done",
+        or_(OitDocument.rules_version.is_(None), OitDocument.rules_version != version),
+    )
+
+
+def stale_count(db: Session) -> int:
+    return _stale_query(db, rules_version()).count()
+
+
+def _load_report(doc: OitDocument) -> Optional[Dict[str, object]]:
+    if not doc.compliance_report_path:
+        return None
+    try:
+        report = json.loads((BACK_DIR / doc.compliance_report_path).read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    # Documentos deduplicados pueden apuntar al reporte de otro ya reevaluado
+    if doc.rules_version and report.get("rules_version") != doc.rules_version:
+        return None
+    return report
+
+
+def _without(values: Optional[str], previous: Optional[List[str]]) -> List[str]:
+    # Ítems aportados por la IA: los del documento que no venían del compliance anterior
+    if previous is None:
+        return []
+    old = set(previous)
+    try:
+        items = json.loads(values or "[]")
+    except Exception:
+        return []
+    return [item for item in items if item not in old]
+
+
+def _apply(
+    db: Session,
+    doc: OitDocument,
+    report: Dict[str, object],
+    previous: Optional[Dict[str, object]],
+    after_commit: List[Callable[[], None]],
+) -> bool:
+    """Escribe el nuevo resultado en el documento; devuelve ``True`` si cambió el estado.
+
+    Los archivos del reporte y la notificación se agregan a ``after_commit``.
+    """
+    result = report.get("result", {})
+    old_result = (previous or {}).get("result") or {}
+    known = previous is not None and bool(old_result)
+    alerts = merge_lists(result.get("alerts"), _without(doc.alerts, old_result.get("alerts") if known else None))
+    missing = merge_lists(result.get("missing"), _without(doc.missing, old_result.get("missing") if known else None))
+    evidence = merge_lists(
+        result.get("evidence"), _without(doc.evidence, old_result.get("evidence") if known else None)
+    )
+
+    old_status = doc.status
+    doc.status = result.get("status") or doc.status
+    doc.summary = result.get("summary") or doc.summary
+    doc.alerts = json.dumps(alerts, ensure_ascii=False)
+    doc.missing = json.dumps(missing, ensure_ascii=False)
+    doc.evidence = json.dumps(evidence, ensure_ascii=False)
+    doc.rules_version = str(report.get("rules_version") or doc.rules_version)
+    # Rutas deterministas: se fijan en la transacción y los archivos se escriben tras confirmarla
+    if report.get("rules_version"):
+        doc.compliance_bundle_path = str(bundle_path_for_version(str(report["rules_version"])).relative_to(BACK_DIR))
+    doc.compliance_report_path = str(report_path_for(doc).relative_to(BACK_DIR))
+    db.add(doc)
+    after_commit.append(lambda: write_compliance_files(doc, report))
+    if doc.status != old_status:
+        after_commit.append(lambda: notify_result(db, doc, alerts, missing, old_status))
+        return True
+    return False
+
+
+def _process_batch(
+    db: Session,
+    batch: List[OitDocument],
+    pool: ProcessPoolExecutor,
+    progress: ReevaluationProgress,
+    after_commit: List[Callable[[], None]],
+) -> None:
+    # Documentos con el mismo contenido se evalúan una sola vez
+    groups: "OrderedDict[str, List[OitDocument]]" = OrderedDict()
+    # Leer todos los reportes antes de escribir: los duplicados pueden compartir archivo
+    previous_reports = {doc.id: _load_report(doc) for doc in batch}
+    for doc in batch:
+        previous = previous_reports[doc.id]
+        report = reevaluate_from_report(previous) if previous else None
+        if report is not None:
+            progress.changed += int(_apply(db, doc, report, previous, after_commit))
+            progress.reused += 1
+            progress.processed += 1
+            continue
+        groups.setdefault(doc.content_hash or doc.filename, []).append(doc)
+
+    futures = {
+        pool.submit(_evaluate_file, str(BACK_DIR / docs[0].filename), docs[0].content_hash): docs
+        for docs in groups.values()
+    }
+    for future in as_completed(futures):
+        docs = futures[future]
+        try:
+            report = future.result()
+        except Exception as exc:
+            logger.warning(f"No se pudo reevaluar OIT ids={[d.id for d in docs]}: {exc}")
+            progress.failed += len(docs)
+            progress.processed += len(docs)
+            continue
+        for doc in docs:
+            progress.changed += int(_apply(db, doc, report, previous_reports[doc.id], after_commit))
+            progress.processed += 1
+
+
+def run_reevaluation(
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    limit: Optional[int] = None,
+    on_progress: Optional[Callable[[ReevaluationProgress], None]] = None,
+) -> ReevaluationProgress:
+    """Reevalúa los documentos con reglas desactualizadas, por lotes.
+
+    Cada lote se confirma en su propia transacción. Los documentos que fallan
+    conservan su versión anterior y se reintentan en la próxima ejecución.
+    """
+    global _progress
+    batch_size = batch_size or settings.reevaluation_batch_size
+    workers = workers or settings.reevaluation_workers or os.cpu_count() or 1
+    version = rules_version()
+    progress = ReevaluationProgress(rules_version=version, running=True, started_at=datetime.utcnow())
+    _progress = progress
+
+    db = SessionLocal()
+    try:
+        total = _stale_query(db, version).count()
+        progress.total = min(total, limit) if limit else total
+        logger.info(f"Reevaluación compliance: {progress.total} documentos desactualizados (version={version})")
+        last_id = 0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        ) as pool:
+            while progress.processed < progress.total:
+                size = min(batch_size, progress.total - progress.processed)
+                batch = (
+                    _stale_query(db, version)
+                    .filter(OitDocument.id > last_id)
+                    .order_by(OitDocument.id)
+                    .limit(size)
+                    .all()
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                after_commit: List[Callable[[], None]] = []
+                try:
+                    _process_batch(db, batch, pool, progress, after_commit)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                for action in after_commit:
+                    try:
+                        action()
+                    except Exception as exc:
+                        # El lote ya está confirmado; un reporte faltante se recalcula en la próxima ejecución
+                        logger.warning(f"Fallo una acción posterior al lote de reevaluación: {exc}")
+                logger.info(
+                    "Reevaluación compliance: %d/%d (cambiaron=%d, reutilizados=%d, fallidos=%d)",
+                    progress.processed,
+                    progress.total,
+                    progress.changed,
+                    progress.reused,
+                    progress.failed,
+                )
+                if on_progress:
+                    on_progress(progress)
+    except Exception as exc:
+        logger.exception("Fallo la reevaluación compliance")
+        progress.error = str(exc)
+    finally:
+        db.close()
+        progress.running = False
+        progress.finished_at = datetime.utcnow()
+    return progress
+
+
+def start_reevaluation() -> Optional[ReevaluationProgress]:
+    """Lanza la reevaluación en un hilo; ``None`` si ya hay una en curso."""
+    if not _run_lock.acquire(blocking=False):
+        return None
+
+    def _run() -> None:
+        try:
+            run_reevaluation()
+        finally:
+            _run_lock.release()
+
+    global _progress
+    _progress = ReevaluationProgress(rules_version=rules_version(), running=True, started_at=datetime.utcnow())
+    threading.Thread(target=_run, name="oit-reevaluate", daemon=True).start()
+    return _progress
+
+
+def current_progress() -> Optional[ReevaluationProgress]:
+    return _progress
@@ -0,0 +1,177 @@
+"""Selección de fragmentos de referencia relevantes para el prompt de revisión.
+
+Los archivos de ``reference_data`` se cortan en fragmentos por sección
+(encabezados Markdown y, si una sección es larga, por líneas) y se indexan una
+vez con BM25; el índice se reconstruye sólo si cambian los archivos. Cada
+revisión incluye los ``REFERENCE_TOP_K`` fragmentos más afines al documento
+que quepan en ``REFERENCE_MAX_TOKENS``, en lugar de todo el corpus.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from ..core.config import settings
+from .bm25 import Bm25Index, analyze
+
+logger = logging.getLogger("oit.reference")
+
+REFERENCE_DIR = Path(__file__).resolve().parents[1] / "reference_data"
+REFERENCE_SUFFIXES = {".txt", ".md", ".json"}
+
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*\S)\s*$")
+# Términos del documento usados como consulta (los más frecuentes)
+_QUERY_TERMS = 256
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximación de tokens del modelo (~4 caracteres por token)."""
+    return len(text) // 4 + 1
+
+
+@dataclass(frozen=True)
+class ReferenceChunk:
+    source: str  # ruta relativa a reference_data
+    section: str
+    text: str
+    tokens: int
+
+    def render(self) -> str:
+        title = f"{self.source} › {self.section}" if self.section else self.source
+        return f"[{title}]\n{self.text}"
+
+
+def _split_long(lines: List[str], max_tokens: int) -> List[List[str]]:
+    parts: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for line in lines:
+        tokens = estimate_tokens(line)
+        if current and size + tokens > max_tokens:
+            parts.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    if current:
+        parts.append(current)
+    return parts
+
+
+def chunk_file(source: str, content: str, max_tokens: int) -> List[ReferenceChunk]:
+    """Fragmentos de un archivo: una sección por encabezado, partida si excede ``max_tokens``."""
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for line in content.splitlines():
+        match = _HEADING_RE.match(line)
+        if match:
+            sections.append((match.group(1), []))
+        elif line.strip():
+            sections[-1][1].append(line.rstrip())
+    chunks: List[ReferenceChunk] = []
+    for section, lines in sections:
+        for part in _split_long(lines, max_tokens):
+            text = "\n".join(part)
+            chunks.append(ReferenceChunk(source=source, section=section, text=text, tokens=estimate_tokens(text)))
+    return chunks
+
+
+class ReferenceIndex:
+    def __init__(self, chunks: List[ReferenceChunk]):
+        self.chunks = chunks
+        self.total_tokens = sum(chunk.tokens for chunk in chunks)
+        self.index = Bm25Index(k1=settings.compliance_bm25_k1, b=settings.compliance_bm25_b)
+        for chunk in chunks:
+            self.index.add(analyze(f"{chunk.section}\n{chunk.text}"))
+
+    def select(self, document_text: str, max_tokens: int, top_k: int) -> List[ReferenceChunk]:
+        """Fragmentos más afines a ``document_text`` dentro del presupuesto, en orden original."""
+        if self.total_tokens <= max_tokens:
+            return list(self.chunks)
+        query = [term for term, _ in Counter(analyze(document_text)).most_common(_QUERY_TERMS)]
+        ranked = [chunk_id for chunk_id, _ in self.index.top_k(query, len(self.chunks))]
+        if not ranked:
+            # Sin términos en común: las primeras secciones (criterios generales)
+            ranked = list(range(len(self.chunks)))
+        chosen: List[int] = []
+        used = 0
+        for chunk_id in ranked:
+            tokens = self.chunks[chunk_id].tokens
+            if used + tokens > max_tokens:
+                continue
+            chosen.append(chunk_id)
+            used += tokens
+            if len(chosen) >= top_k:
+                break
+        return [self.chunks[chunk_id] for chunk_id in sorted(chosen)]
+
+
+_index_lock = threading.Lock()
+_index_signature: Optional[Tuple[Tuple[str, int, int], ...]] = None
+_index: Optional[ReferenceIndex] = None
+
+
+def _reference_paths() -> List[Path]:
+    if not REFERENCE_DIR.exists():
+        return []
+    return sorted(p for p in REFERENCE_DIR.glob("**/*") if p.is_file() and p.suffix.lower() in REFERENCE_SUFFIXES)
+
+
+def _signature(paths: List[Path]) -> Tuple[Tuple[str, int, int], ...]:
+    entries = []
+    for path in paths:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((str(path), st.st_mtime_ns, st.st_size))
+    return tuple(entries)
+
+
+def load_reference_index() -> ReferenceIndex:
+    """Índice de fragmentos de referencia; sólo se reconstruye si cambian los archivos."""
+    global _index, _index_signature
+    paths = _reference_paths()
+    signature = _signature(paths)
+    with _index_lock:
+        if _index is not None and signature == _index_signature:
+            return _index
+        chunks: List[ReferenceChunk] = []
+        for path in paths:
+            try:
+                content = path.read_text(encoding="utf-8", errors="ignore")
+            except Exception:
+                continue
+            source = path.relative_to(REFERENCE_DIR).as_posix()
+            chunks.extend(chunk_file(source, content, settings.reference_chunk_tokens))
+        _index, _index_signature = ReferenceIndex(chunks), signature
+        logger.info(
+            "Índice de referencias: %d archivos, %d fragmentos, ~%d tokens",
+            len(paths),
+            len(chunks),
+            _index.total_tokens,
+        )
+        return _index
+
+
+def select_reference_text(
+    document_text: str, max_tokens: Optional[int] = None, top_k: Optional[int] = None
+) -> str:
+    """Texto de referencia para el prompt: sólo los fragmentos relevantes al documento."""
+    index = load_reference_index()
+    chunks = index.select(
+        document_text or "",
+        max_tokens or settings.reference_max_tokens,
+        top_k or settings.reference_top_k,
+    )
+    if len(chunks) < len(index.chunks):
+        logger.info(
+            "Referencias para el prompt: %d de %d fragmentos (~%d tokens)",
+            len(chunks),
+            len(index.chunks),
+            sum(chunk.tokens for chunk in chunks),
+        )
+    return "\n\n".join(chunk.render() for chunk in chunks)
@@ -0,0 +1,23 @@
+"""Utilidades compartidas para combinar resultados de revisión."""
+from __future__ import annotations
+
+from typing import List
+
+
+def merge_lists(*lists: List[str] | None) -> List[str]:
+    """Une listas de ítems sin duplicados (ignorando mayúsculas), en orden de aparición."""
+    seen: set[str] = set()
+    merged: List[str] = []
+    for lst in lists:
+        if not lst:
+            continue
+        for item in lst:
+            value = (item or "").strip()
+            if not value:
+                continue
+            key = value.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(value)
+    return merged
@@ -0,0 +1,197 @@
+"""Esquema del formulario de muestreo generado con IA, calculado una sola vez.
+
+El esquema se genera en segundo plano al aprobar el plan (o a pedido) y se
+guarda en el documento junto con la clave de lo que lo produjo: el contenido
+del documento y el modelo. ``GET /oit/{id}/sampling/schema`` sólo lee lo
+guardado; si la clave ya no coincide sirve el esquema anterior (o el estático)
+y encola la regeneración.
+
+La generación pide JSON a Ollama con temperatura 0, así la salida se valida
+siempre y reintentos sobre el mismo contenido salen de la caché IA.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..database import SessionLocal
+from ..models.oit_document import OitDocument
+from .ai import OitAiService, document_excerpt
+from .ai_scheduler import AiPriority
+from .text_cache import iter_document_pages
+
+logger = logging.getLogger("oit.sampling_schema")
+
+SCHEMA_PROMPT = (
+    "Genera un esquema JSON para el formulario de muestreo de esta OIT con la forma "
+    '{"title": str, "sections": [{"key": str, "label": str, "fields": '
+    '[{"key": str, "label": str, "type": "text|number|date|textarea"}]}]}. '
+    "Incluye los parámetros y mediciones que pide el documento. Responde sólo el JSON."
+)
+FIELD_TYPES = {"text", "number", "date", "textarea"}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="oit-sampling-schema")
+_in_flight: Set[int] = set()
+_in_flight_lock = threading.Lock()
+
+
+def default_schema(doc: OitDocument) -> Dict[str, Any]:
+    """Esquema estático usado mientras no hay uno generado."""
+    return {
+        "title": f"Formulario de muestreo OIT #{doc.id}",
+        "sections": [
+            {
+                "key": "general",
+                "label": "Datos generales",
+                "fields": [
+                    {"key": "fecha_inicio", "label": "Fecha de inicio", "type": "date"},
+                    {"key": "ubicacion", "label": "Ubicación", "type": "text"},
+                    {"key": "responsable", "label": "Responsable", "type": "text"},
+                ]
+            },
+            {
+                "key": "mediciones",
+                "label": "Mediciones",
+                "fields": [
+                    {"key": "ph_agua", "label": "pH del agua", "type": "number"},
+                    {"key": "turbidez", "label": "Turbidez (NTU)", "type": "number"},
+                    {"key": "observaciones", "label": "Observaciones", "type": "textarea"},
+                ]
+            }
+        ]
+    }
+
+
+def schema_key(doc: OitDocument, model: str) -> str:
+    """Identifica las entradas del esquema; si cambia, el guardado queda obsoleto."""
+    return f"{doc.content_hash or doc.filename}:{model}"
+
+
+def schema_etag(schema_json: str) -> str:
+    return '"' + hashlib.sha256(schema_json.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """``True`` si ``If-None-Match`` incluye ``etag`` (o ``*``); compara débilmente, sin ``W/``."""
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def is_current(doc: OitDocument) -> bool:
+    """``True`` si el esquema guardado corresponde al contenido y modelo vigentes."""
+    return bool(doc.sampling_schema) and doc.sampling_schema_key == schema_key(doc, OitAiService().model)
+
+
+def _clean_schema(raw: str) -> Optional[Dict[str, Any]]:
+    """Esquema normalizado, o ``None`` si la respuesta no tiene secciones con campos válidos."""
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end == -1:
+        return None
+    try:
+        data = json.loads(raw[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("sections"), list):
+        return None
+    sections = []
+    for section in data["sections"]:
+        if not isinstance(section, dict) or not isinstance(section.get("fields"), list):
+            continue
+        fields = [
+            {
+                "key": str(field["key"]),
+                "label": str(field.get("label") or field["key"]),
+                "type": field.get("type") if field.get("type") in FIELD_TYPES else "text",
+            }
+            for field in section["fields"]
+            if isinstance(field, dict) and field.get("key")
+        ]
+        if fields:
+            sections.append({
+                "key": str(section.get("key") or f"seccion_{len(sections) + 1}"),
+                "label": str(section.get("label") or section.get("key") or "Sección"),
+                "fields": fields,
+            })
+    if not sections:
+        return None
+    return {"title": str(data.get("title") or ""), "sections": sections}
+
+
+def _valid_response(data: Dict[str, Any]) -> bool:
+    return _clean_schema(data.get("response") or "") is not None
+
+
+def generate_sampling_schema(
+    db: Session, doc: OitDocument, priority: AiPriority = AiPriority.BACKGROUND, refresh: bool = False
+) -> Optional[str]:
+    """Genera el esquema con IA y lo guarda en ``doc``; ``None`` si el modelo no respondió uno válido.
+
+    Un fallo deja el esquema anterior intacto. Con ``refresh`` se consulta a
+    Ollama aunque la respuesta esté en la caché IA; en la caché sólo quedan
+    respuestas que son un esquema válido.
+    """
+    ai = OitAiService(priority=priority)
+    if not ai.is_model_available():
+        logger.info(f"Esquema de muestreo OIT id={doc.id}: modelo {ai.model} no disponible")
+        return None
+    text = document_excerpt(iter_document_pages(doc), settings.ai_document_max_chars)
+    payload = {
+        "model": ai.model,
+        "prompt": f"[SISTEMA]: {SCHEMA_PROMPT}\n\n[DOCUMENTO]:\n{text}",
+        "stream": False,
+        "format": "json",
+        "options": {"temperature": 0, "num_ctx": 4096},
+    }
+    try:
+        data = ai._generate(payload, timeout=120, refresh=refresh, accept=_valid_response)
+    except Exception as e:
+        logger.warning(f"No se pudo generar el esquema de muestreo OIT id={doc.id}: {e}")
+        return None
+    schema = _clean_schema(data.get("response") or "")
+    if schema is None:
+        logger.warning(f"Esquema de muestreo OIT id={doc.id}: la respuesta del modelo no es un esquema válido")
+        return None
+    schema["title"] = schema["title"] or f"Formulario de muestreo OIT #{doc.id}"
+    doc.sampling_schema = json.dumps(schema, ensure_ascii=False)
+    doc.sampling_schema_key = schema_key(doc, ai.model)
+    db.add(doc)
+    db.commit()
+    logger.info(f"Esquema de muestreo generado para OIT id={doc.id} ({len(schema['sections'])} secciones)")
+    return doc.sampling_schema
+
+
+def _refresh(doc_id: int) -> None:
+    db = SessionLocal()
+    try:
+        doc = db.get(OitDocument, doc_id)
+        if doc is not None and not is_current(doc):
+            generate_sampling_schema(db, doc)
+    except Exception:
+        logger.exception(f"Fallo la generación del esquema de muestreo OIT id={doc_id}")
+    finally:
+        db.close()
+        with _in_flight_lock:
+            _in_flight.discard(doc_id)
+
+
+def submit_sampling_schema(doc_id: int) -> None:
+    """Encola la generación en segundo plano (una sola vez por documento a la vez)."""
+    with _in_flight_lock:
+        if doc_id in _in_flight:
+            return
+        _in_flight.add(doc_id)
+    _executor.submit(_refresh, doc_id)
@@ -0,0 +1,94 @@
+"""Almacenamiento direccionado por contenido de los archivos OIT.
+
+Cada archivo se guarda una sola vez como ``<sha256><ext>`` en ``UPLOADS_DIR``
+y se registra en ``stored_files`` con un contador de referencias; los
+documentos que suben el mismo contenido comparten el archivo físico, que se
+elimina cuando la última referencia se libera.
+"""
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import BACK_DIR
+from ..models.stored_file import StoredFile
+from .uploads import ReceivedUpload, discard_upload, finalize_upload
+
+logger = logging.getLogger("oit.storage")
+
+
+def _acquire(db: Session, sha256: str) -> StoredFile | None:
+    updated = (
+        db.query(StoredFile)
+        .filter(StoredFile.sha256 == sha256)
+        .update({StoredFile.ref_count: StoredFile.ref_count + 1}, synchronize_session=False)
+    )
+    if not updated:
+        return None
+    db.commit()
+    return db.get(StoredFile, sha256)
+
+
+def store_upload(db: Session, upload: ReceivedUpload, directory: Path) -> StoredFile:
+    """Registra el archivo recibido, reutilizando el existente si el hash ya se conoce."""
+    existing = _acquire(db, upload.sha256)
+    if existing is not None and (BACK_DIR / existing.path).exists():
+        discard_upload(upload)
+        logger.info(f"Archivo duplicado sha256={upload.sha256}; referencias={existing.ref_count}")
+        return existing
+
+    dest = finalize_upload(upload, directory / f"{upload.sha256}{upload.suffix}")
+    relative = str(dest.relative_to(BACK_DIR))
+    if existing is not None:
+        # El registro existía pero el archivo se había perdido: restaurarlo
+        existing.path = relative
+        db.add(existing)
+        db.commit()
+        return existing
+
+    stored = StoredFile(sha256=upload.sha256, path=relative, size=upload.size, ref_count=1)
+    db.add(stored)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra subida concurrente registró el mismo contenido
+        db.rollback()
+        stored = _acquire(db, upload.sha256)
+    db.refresh(stored)
+    return stored
+
+
+def release_file(db: Session, sha256: str | None) -> None:
+    """Libera una referencia; al llegar a cero borra el archivo y su registro.
+
+    Como ``_acquire``, el decremento es un UPDATE atómico; el registro se borra
+    sólo si el contador quedó en cero, en la misma transacción, así una subida
+    duplicada que toma la referencia en paralelo no pierde el archivo.
+    """
+    if not sha256:
+        return
+    released = (
+        db.query(StoredFile)
+        .filter(StoredFile.sha256 == sha256)
+        .update({StoredFile.ref_count: StoredFile.ref_count - 1}, synchronize_session=False)
+    )
+    if not released:
+        return
+    path = db.query(StoredFile.path).filter(StoredFile.sha256 == sha256).scalar()
+    deleted = (
+        db.query(StoredFile)
+        .filter(StoredFile.sha256 == sha256, StoredFile.ref_count <= 0)
+        .delete(synchronize_session=False)
+    )
+    if deleted and path:
+        # Antes del commit: hasta entonces ninguna subida puede tomar el registro
+        try:
+            (BACK_DIR / path).unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            logger.warning(f"No se pudo eliminar archivo {path}: {exc}")
+    db.commit()
@@ -0,0 +1,233 @@
+"""Caché persistente del texto extraído de los documentos.
+
+El texto se guarda comprimido como ``uploads/oit/text/<sha256>.v<N>.txt.gz``
+(clave: hash del archivo y versión del extractor), con las páginas separadas
+por ``\\f``. La extracción se escribe página a página directamente al archivo
+y los consumidores leen también en streaming (``iter_pages``), de modo que la
+memoria no crece con el tamaño del documento. Un LRU pequeño en memoria
+guarda sólo documentos por debajo de ``TEXT_CACHE_MAX_CHARS``.
+
+Una extracción incompleta (rangos de páginas vencidos o fallidos) no se
+guarda: se sirve una vez desde un temporal y la próxima lectura reintenta.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from ..core.config import BACK_DIR, settings
+from .ai import iter_extracted_pages
+from .pdf_extraction import ExtractionStatus
+
+logger = logging.getLogger("oit.text_cache")
+
+TEXT_CACHE_DIR = BACK_DIR / "uploads" / "oit" / "text"
+TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Incrementar cuando cambie la forma de extraer texto para invalidar la caché
+EXTRACTOR_VERSION = 2
+PAGE_SEPARATOR = "\f"
+_READ_BLOCK = 64 * 1024
+
+_lock = threading.Lock()
+_lru: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_for(path: Path) -> str:
+    # Memo por (ruta, mtime, tamaño) para no rehashear documentos antiguos sin content_hash
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _hash_memo.get(key)
+    if cached:
+        return cached
+    sha = file_sha256(path)
+    with _lock:
+        if len(_hash_memo) >= 4096:
+            _hash_memo.clear()
+        _hash_memo[key] = sha
+    return sha
+
+
+def _sidecar_path(sha256: str) -> Path:
+    return TEXT_CACHE_DIR / f"{sha256}.v{EXTRACTOR_VERSION}.txt.gz"
+
+
+def _remember(sha256: str, pages: Tuple[str, ...]) -> None:
+    with _lock:
+        _lru[sha256] = pages
+        _lru.move_to_end(sha256)
+        while len(_lru) > max(settings.text_cache_entries, 0):
+            _lru.popitem(last=False)
+
+
+def _write_pages(sha256: str, pages: Iterable[str], status: Optional[ExtractionStatus] = None) -> Optional[Path]:
+    """Escribe las páginas a medida que llegan; devuelve dónde quedaron.
+
+    El sidecar definitivo (escritura atómica) si la extracción fue completa;
+    el temporal si quedó incompleta (lo borra el llamador); ``None`` si no hubo texto.
+    """
+    dest = _sidecar_path(sha256)
+    tmp = dest.with_name(f".{uuid.uuid4().hex}.part")
+    wrote_text = False
+    try:
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as fh:
+            for page in pages:
+                fh.write(page.replace(PAGE_SEPARATOR, "\n"))
+                fh.write(PAGE_SEPARATOR)
+                wrote_text = wrote_text or bool(page.strip())
+        if not wrote_text:
+            # Documento ilegible: no se cachea para reintentar en la próxima lectura
+            tmp.unlink()
+            return None
+        if status is not None and not status.complete:
+            logger.warning(f"Extracción incompleta de {sha256}; no se guarda en caché")
+            return tmp
+        os.replace(tmp, dest)
+        return dest
+    except Exception as exc:
+        logger.warning(f"No se pudo guardar texto extraído {sha256}: {exc}")
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+        return None
+
+
+def _iter_file_pages(path: Path) -> Iterator[str]:
+    buffer = ""
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for block in iter(lambda: fh.read(_READ_BLOCK), ""):
+            buffer += block
+            *complete, buffer = buffer.split(PAGE_SEPARATOR)
+            yield from complete
+    if buffer:
+        yield buffer
+
+
+def has_text(sha256: str) -> bool:
+    with _lock:
+        if sha256 in _lru:
+            return True
+    return _sidecar_path(sha256).exists()
+
+
+def iter_cached_pages(sha256: str) -> Iterator[str]:
+    """Lee las páginas cacheadas en streaming (vacío si no hay caché)."""
+    with _lock:
+        cached = _lru.get(sha256)
+        if cached is not None:
+            _lru.move_to_end(sha256)
+            _stats["memory_hits"] += 1
+    if cached is not None:
+        yield from cached
+        return
+
+    path = _sidecar_path(sha256)
+    if not path.exists():
+        return
+    with _lock:
+        _stats["disk_hits"] += 1
+    # Documentos pequeños se retienen para el LRU; los grandes sólo se emiten
+    limit = settings.text_cache_max_chars
+    kept: Optional[list] = []
+    kept_chars = 0
+    try:
+        for page in _iter_file_pages(path):
+            if kept is not None:
+                kept_chars += len(page)
+                kept = kept if kept_chars <= limit else None
+                if kept is not None:
+                    kept.append(page)
+            yield page
+    except Exception as exc:
+        logger.warning(f"Caché de texto ilegible {path.name}: {exc}")
+        return
+    if kept is not None:
+        _remember(sha256, tuple(kept))
+
+
+def _extract(path: Path, sha: str) -> Optional[Path]:
+    with _lock:
+        _stats["misses"] += 1
+    status = ExtractionStatus()
+    return _write_pages(sha, iter_extracted_pages(path, status=status), status)
+
+
+def ensure_text(path: Path, sha256: Optional[str] = None) -> Optional[str]:
+    """Extrae el texto del archivo si no está en caché; su hash, o ``None`` si no hay texto.
+
+    Con una extracción incompleta devuelve el hash aunque no quede en caché.
+    """
+    if not path.exists():
+        return None
+    sha = sha256 or _hash_for(path)
+    if has_text(sha):
+        return sha
+    written = _extract(path, sha)
+    if written is None:
+        return None
+    if written != _sidecar_path(sha):
+        written.unlink(missing_ok=True)
+    return sha
+
+
+def iter_pages(path: Path, sha256: Optional[str] = None) -> Iterator[str]:
+    """Páginas del archivo, extrayéndolo (y cacheándolo) sólo la primera vez."""
+    if not path.exists():
+        return
+    sha = sha256 or _hash_for(path)
+    if not has_text(sha):
+        written = _extract(path, sha)
+        if written is None:
+            # La extracción no produjo texto: no hay nada que emitir
+            return
+        if written != _sidecar_path(sha):
+            # Extracción incompleta: se emite desde el temporal, sin cachear
+            try:
+                yield from _iter_file_pages(written)
+            finally:
+                written.unlink(missing_ok=True)
+            return
+    yield from iter_cached_pages(sha)
+
+
+def get_text(path: Path, sha256: Optional[str] = None) -> str:
+    """Texto completo del archivo (para consumidores que lo necesitan entero)."""
+    return "\n".join(iter_pages(path, sha256)).strip()
+
+
+def iter_document_pages(doc) -> Iterator[str]:
+    """Páginas de un ``OitDocument`` usando su ``content_hash`` cuando existe."""
+    return iter_pages(BACK_DIR / doc.filename, doc.content_hash)
+
+
+def ensure_document_text(doc) -> bool:
+    """Extrae (si hace falta) el texto del documento; ``False`` si quedó vacío."""
+    return ensure_text(BACK_DIR / doc.filename, doc.content_hash) is not None
+
+
+def document_text(doc) -> str:
+    return get_text(BACK_DIR / doc.filename, doc.content_hash)
+
+
+def cache_stats() -> Dict[str, int]:
+    with _lock:
+        return {**_stats, "memory_entries": len(_lru)}
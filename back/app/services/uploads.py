@@ -0,0 +1,134 @@
+"""Recepción de archivos subidos en streaming.
+
+Los archivos se copian a un temporal en bloques de tamaño fijo calculando el
+SHA-256 y el tamaño sobre la marcha, de modo que nunca se mantiene el
+documento completo en memoria. Los límites de tamaño y de páginas se validan
+antes de mover (``os.replace``, atómico) el temporal a su ruta definitiva.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+
+# Import condicional de pypdf
+try:
+    from pypdf import PdfReader  # type: ignore
+except Exception:
+    PdfReader = None  # type: ignore
+
+logger = logging.getLogger("oit.uploads")
+
+
+class UploadRejected(Exception):
+    """El archivo subido no cumple los límites configurados."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class ReceivedUpload:
+    temp_path: Path
+    sha256: str
+    size: int
+    suffix: str
+
+
+def _count_pdf_pages(path: Path) -> Optional[int]:
+    if PdfReader is None:
+        return None
+    try:
+        return len(PdfReader(str(path)).pages)
+    except Exception:
+        return None
+
+
+def _remove(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+async def receive_upload(
+    file,
+    directory: Path,
+    *,
+    max_bytes: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> ReceivedUpload:
+    """Copia ``file`` (``UploadFile``) a un temporal dentro de ``directory``.
+
+    Lanza ``UploadRejected`` si el archivo está vacío o excede ``max_bytes`` /
+    ``max_pages``; en ese caso el temporal se elimina.
+    """
+    max_bytes = settings.upload_max_bytes if max_bytes is None else max_bytes
+    max_pages = settings.upload_max_pages if max_pages is None else max_pages
+    chunk_size = chunk_size or settings.upload_chunk_size
+    suffix = Path(file.filename or "").suffix.lower()
+
+    # Rechazo temprano si el cliente declaró un tamaño mayor al permitido
+    declared = getattr(file, "size", None)
+    if max_bytes and declared and declared > max_bytes:
+        raise UploadRejected(413, f"El archivo excede el tamaño máximo de {max_bytes} bytes")
+
+    directory.mkdir(parents=True, exist_ok=True)
+    temp_path = directory / f".upload-{uuid.uuid4().hex}{suffix}.part"
+    digest = hashlib.sha256()
+    size = 0
+    handle = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise UploadRejected(413, f"El archivo excede el tamaño máximo de {max_bytes} bytes")
+            digest.update(chunk)
+            await run_in_threadpool(handle.write, chunk)
+        await run_in_threadpool(handle.close)
+
+        if size == 0:
+            raise UploadRejected(400, "No se pudo leer el documento o está vacío")
+        if max_pages and suffix == ".pdf":
+            pages = await run_in_threadpool(_count_pdf_pages, temp_path)
+            if pages is not None and pages > max_pages:
+                raise UploadRejected(413, f"El PDF tiene {pages} páginas; el máximo permitido es {max_pages}")
+    except BaseException:
+        handle.close()
+        await run_in_threadpool(_remove, temp_path)
+        raise
+
+    return ReceivedUpload(temp_path=temp_path, sha256=digest.hexdigest(), size=size, suffix=suffix)
+
+
+def receive_bytes(data: bytes, directory: Path, suffix: str) -> ReceivedUpload:
+    """Variante síncrona para contenido ya en memoria (p. ej. ``/oit/upload-raw``)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    temp_path = directory / f".upload-{uuid.uuid4().hex}{suffix}.part"
+    temp_path.write_bytes(data)
+    return ReceivedUpload(temp_path=temp_path, sha256=hashlib.sha256(data).hexdigest(), size=len(data), suffix=suffix)
+
+
+def finalize_upload(upload: ReceivedUpload, dest: Path) -> Path:
+    """Mueve el temporal a ``dest`` de forma atómica (mismo sistema de archivos)."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(upload.temp_path, dest)
+    return dest
+
+
+def discard_upload(upload: ReceivedUpload) -> None:
+    _remove(upload.temp_path)
@@ -22,7 +22,7 @@ settings = Settings(
 )
 
 from app.database import Base  # noqa: E402
-from app.models import oit_document, resource, system_user, notification  # noqa: E402,F401
+from app.models import oit_document, resource, system_user, notification, oit_job, stored_file  # noqa: E402,F401
 
 
 # this is the Alembic Config object, which provides
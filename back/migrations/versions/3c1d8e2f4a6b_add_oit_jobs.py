@@ -0,0 +1,47 @@
+"""add_oit_jobs
+
+Revision ID: 3c1d8e2f4a6b
+Revises: 07a52f06393e
+Create Date: 2026-10-18 09:12:41.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1d8e2f4a6b'
+down_revision: Union[str, None] = '07a52f06393e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "oit_documents",
+        sa.Column("processing_status", sa.String(), nullable=False, server_default=sa.text("'done'")),
+    )
+
+    op.create_table(
+        "oit_jobs",
+        sa.Column("id", sa.String(length=32), primary_key=True),
+        sa.Column("document_id", sa.Integer(), sa.ForeignKey("oit_documents.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("kind", sa.String(length=50), nullable=False, server_default=sa.text("'ingest'")),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default=sa.text("'queued'")),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_oit_jobs_document_id", "oit_jobs", ["document_id"])
+    op.create_index("ix_oit_jobs_status", "oit_jobs", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_oit_jobs_status", table_name="oit_jobs")
+    op.drop_index("ix_oit_jobs_document_id", table_name="oit_jobs")
+    op.drop_table("oit_jobs")
+
+    op.drop_column("oit_documents", "processing_status")
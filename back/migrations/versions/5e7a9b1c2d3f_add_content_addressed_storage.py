@@ -0,0 +1,43 @@
+"""add_content_addressed_storage
+
+Revision ID: 5e7a9b1c2d3f
+Revises: 3c1d8e2f4a6b
+Create Date: 2026-10-18 10:03:27.551902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a9b1c2d3f'
+down_revision: Union[str, None] = '3c1d8e2f4a6b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stored_files",
+        sa.Column("sha256", sa.String(length=64), primary_key=True),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+
+    op.add_column("oit_documents", sa.Column("content_hash", sa.String(length=64), nullable=True))
+    op.add_column("oit_documents", sa.Column("rules_version", sa.String(), nullable=True))
+    op.add_column("oit_documents", sa.Column("ai_model", sa.String(), nullable=True))
+    op.create_index("ix_oit_documents_content_hash", "oit_documents", ["content_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_oit_documents_content_hash", table_name="oit_documents")
+    op.drop_column("oit_documents", "ai_model")
+    op.drop_column("oit_documents", "rules_version")
+    op.drop_column("oit_documents", "content_hash")
+
+    op.drop_table("stored_files")
@@ -0,0 +1,29 @@
+"""add_oit_partial_flag
+
+Revision ID: 8b2f4c6d1e9a
+Revises: 5e7a9b1c2d3f
+Create Date: 2026-10-18 11:42:10.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2f4c6d1e9a'
+down_revision: Union[str, None] = '5e7a9b1c2d3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "oit_documents",
+        sa.Column("partial", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("oit_documents", "partial")
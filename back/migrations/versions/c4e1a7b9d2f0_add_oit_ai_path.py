@@ -0,0 +1,26 @@
+"""add_oit_ai_path
+
+Revision ID: c4e1a7b9d2f0
+Revises: 8b2f4c6d1e9a
+Create Date: 2026-10-18 16:05:44.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1a7b9d2f0'
+down_revision: Union[str, None] = '8b2f4c6d1e9a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("oit_documents", sa.Column("ai_path", sa.String(length=16), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("oit_documents", "ai_path")
@@ -0,0 +1,28 @@
+"""add_oit_sampling_schema
+
+Revision ID: e7a3c5f1b8d4
+Revises: c4e1a7b9d2f0
+Create Date: 2026-10-18 17:42:10.318554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c5f1b8d4'
+down_revision: Union[str, None] = 'c4e1a7b9d2f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("oit_documents", sa.Column("sampling_schema", sa.Text(), nullable=True))
+    op.add_column("oit_documents", sa.Column("sampling_schema_key", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("oit_documents", "sampling_schema_key")
+    op.drop_column("oit_documents", "sampling_schema")
@@ -0,0 +1,87 @@
+# back/scripts/bench_pdf_extraction.py
+"""Compara la extracción de PDF serial contra el pool de procesos.
+
+Uso:
+    python scripts/bench_pdf_extraction.py archivo.pdf [--repeat-pages 200] [--runs 3] [--workers 4]
+
+Con ``--repeat-pages`` se genera un PDF temporal repitiendo las páginas del
+archivo de entrada hasta alcanzar ese número, útil para simular OIT grandes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+
+def _build_repeated_pdf(source: Path, total_pages: int) -> Path:
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(str(source))
+    writer = PdfWriter()
+    for index in range(total_pages):
+        writer.add_page(reader.pages[index % len(reader.pages)])
+    fd, name = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as fh:
+        writer.write(fh)
+    return Path(name)
+
+
+def _time_runs(fn, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", type=Path)
+    parser.add_argument("--repeat-pages", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=0, help="Workers del pool (0 = CPUs)")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+
+    if args.workers:
+        settings.pdf_extract_workers = args.workers
+
+    from app.services.pdf_extraction import extract_pdf_pages, page_count, shutdown_pool
+
+    path = args.pdf
+    temp_path = None
+    if args.repeat_pages:
+        temp_path = path = _build_repeated_pdf(args.pdf, args.repeat_pages)
+
+    try:
+        pages = page_count(path)
+        serial_pages = extract_pdf_pages(path, parallel=False)
+        # Calentar el pool para no medir el arranque de procesos
+        parallel_pages = extract_pdf_pages(path, parallel=True)
+        if serial_pages != parallel_pages:
+            print("ADVERTENCIA: el texto paralelo difiere del serial")
+
+        serial = _time_runs(lambda: extract_pdf_pages(path, parallel=False), args.runs)
+        parallel = _time_runs(lambda: extract_pdf_pages(path, parallel=True), args.runs)
+        workers = settings.pdf_extract_workers or os.cpu_count() or 1
+
+        print(f"Páginas: {pages}  workers: {workers}  runs: {args.runs} (mejor tiempo)")
+        print(f"Serial:   {serial:8.3f} s  {pages / serial if serial else 0:8.1f} páginas/s")
+        print(f"Paralelo: {parallel:8.3f} s  {pages / parallel if parallel else 0:8.1f} páginas/s")
+        print(f"Speedup:  {serial / parallel if parallel else 0:8.2f}x")
+    finally:
+        shutdown_pool()
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# back/scripts/reevaluate_compliance.py
+"""Reevalúa las OIT cuya versión de reglas de compliance está desactualizada.
+
+Uso:
+    python scripts/reevaluate_compliance.py [--batch-size 50] [--workers 4] [--limit 1000] [--dry-run]
+
+Se puede interrumpir y volver a ejecutar: los documentos ya actualizados
+quedan con la versión vigente y no se vuelven a procesar.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=0, help="Documentos por transacción")
+    parser.add_argument("--workers", type=int, default=0, help="Procesos del pool (0 = CPUs)")
+    parser.add_argument("--limit", type=int, default=0, help="Máximo de documentos en esta ejecución")
+    parser.add_argument("--dry-run", action="store_true", help="Sólo contar documentos desactualizados")
+    args = parser.parse_args()
+
+    from app.database import SessionLocal
+    from app.services.compliance import rules_version
+    from app.services.reevaluation import run_reevaluation, stale_count
+
+    if args.dry_run:
+        with SessionLocal() as db:
+            print(f"Versión de reglas vigente: {rules_version()}")
+            print(f"Documentos desactualizados: {stale_count(db)}")
+        return
+
+    def _report(progress) -> None:
+        print(
+            f"{progress.processed}/{progress.total} procesados "
+            f"(cambiaron={progress.changed}, reutilizados={progress.reused}, fallidos={progress.failed})",
+            flush=True,
+        )
+
+    progress = run_reevaluation(
+        batch_size=args.batch_size or None,
+        workers=args.workers or None,
+        limit=args.limit or None,
+        on_progress=_report,
+    )
+    if progress.error:
+        print(f"Error: {progress.error}")
+        sys.exit(1)
+    print(f"Listo: versión {progress.rules_version}, {progress.processed} documentos procesados")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,9 @@ export interface OitDocumentOut {
   original_name?: string | null;
   type?: string | null;
   status: string;
+  processing_status?: string; // queued|extracting|reviewing|done|failed
+  job_id?: string | null;
+  partial?: boolean; // veredicto preliminar (primeras páginas)
   summary?: string | null;
   alerts?: string[];
   missing?: string[];
@@ -45,6 +48,7 @@ export interface OitDocumentOut {
   resource_gaps?: Record<string, any> | null;
   approval_notes?: string | null;
   review_notes?: string | null;
+  ai_path?: string | null; // sync|async_pending|async|skip (revisión IA)
   created_at: string;
 }
 
@@ -180,6 +184,17 @@ export interface ChatResponse {
   model?: string;
 }
 
+export interface ChatStreamStats {
+  model?: string;
+  used_fallback: boolean;
+  elapsed_ms: number;
+  first_token_ms?: number | null;
+  prompt_tokens?: number | null;
+  completion_tokens?: number | null;
+  total_duration_ms?: number | null;
+  tokens_per_s?: number | null;
+}
+
 export interface ModelResponse {
   models: string[];
 }
@@ -351,6 +366,56 @@ class ApiClient {
     });
   }
 
+  // Chat en streaming (SSE). Cancelar con `signal` corta también la generación en el servidor.
+  async aiChatStream(
+    message: string,
+    onToken: (text: string) => void,
+    model?: string,
+    signal?: AbortSignal
+  ): Promise<ChatStreamStats | null> {
+    const headers: Record<string, string> = { "Content-Type": "application/json" };
+    const token = this.getToken();
+    if (token) headers["Authorization"] = `Bearer ${token}`;
+
+    const res = await fetch(`${API_BASE_URL}/ai/chat/stream`, {
+      method: "POST",
+      body: JSON.stringify({ message, model }),
+      headers,
+      signal,
+    });
+    if (!res.ok || !res.body) {
+      const text = await res.text();
+      throw new Error(text || `HTTP ${res.status}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let stats: ChatStreamStats | null = null;
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep: number;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const block = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = "message";
+        let data = "";
+        for (const line of block.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+        if (event === "token") onToken(payload.text);
+        else if (event === "done") stats = payload as ChatStreamStats;
+        else if (event === "error") throw new Error(payload.detail || "Error en el chat");
+      }
+    }
+    return stats;
+  }
+
   async getAvailableModels(): Promise<ModelResponse> {
     return await this.request<ModelResponse>(`/ai/models`, { method: "GET" });
   }